@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the VISA resource manager shared by the Qudi hardware
+modules.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import visa
+
+_resource_manager = None
+
+
+def get_resource_manager():
+    """ Return the VISA resource manager shared by the hardware modules.
+
+    It is created at the first call and stays open as long as Qudi runs, the
+    modules only close the resources they opened.
+
+    @return visa.ResourceManager: the shared resource manager
+    """
+    global _resource_manager
+    if _resource_manager is None:
+        _resource_manager = visa.ResourceManager()
+    return _resource_manager
@@ -291,8 +291,8 @@ class CryomonitoringGui(GUIBase):
         """
         Update the lHe level plot.
         """
-        self.lHe_plot.setData(x=np.array(self._cryologic.lHe_time_for_plot, dtype=np.int64),
-                              y=np.array(self._cryologic.lHe_level_for_plot, dtype=np.float64))
+        times, levels = self._cryologic.get_lHe_plot_data()
+        self.lHe_plot.setData(x=times, y=levels)
         return
         
 
@@ -300,12 +300,11 @@ class CryomonitoringGui(GUIBase):
         """
         Update the temperature plot.
         """
+        times, valuesA, valuesB = self._cryologic.get_temp_plot_data()
         if "A" in self._cryologic.temp_channel:
-            self.temp_plotA.setData(x=np.array(self._cryologic.temp_time_for_plot, dtype=np.int64),
-                                y=np.array(self._cryologic.temp_valuesA_for_plot, dtype=np.float64))
+            self.temp_plotA.setData(x=times, y=valuesA)
         if "B" in self._cryologic.temp_channel:
-            self.temp_plotB.setData(x=np.array(self._cryologic.temp_time_for_plot, dtype=np.int64),
-                                y=np.array(self._cryologic.temp_valuesB_for_plot, dtype=np.float64))
+            self.temp_plotB.setData(x=times, y=valuesB)
         if not "A" in self._cryologic.temp_channel:
             self.temp_plotA.setData(x=np.nan*np.ones(2), y=np.nan*np.ones(2))
         elif not "B" in self._cryologic.temp_channel:
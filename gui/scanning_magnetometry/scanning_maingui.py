@@ -18,6 +18,7 @@ along with Qudi. If not, see <http://www.gnu.org/licenses/>.
 Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
 top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
 """
+import math
 import os
 #import time
 import pickle
@@ -118,6 +119,36 @@ class NVScanningGui(GUIBase):
 
         # init file storage
         self.init_file_path = "magnetometry_init.pickle"
+        # widgets restored from the init file: (widget, key, setter name)
+        self._recall_table = [
+            (self._pa.x_position_DoubleSpinBox, "x center position", 'setValue'),
+            (self._pa.y_position_DoubleSpinBox, "y center position", 'setValue'),
+            (self._pa.width_DoubleSpinBox, "scan width", 'setValue'),
+            (self._pa.height_DoubleSpinBox, "scan height", 'setValue'),
+            (self._pa.x_res_SpinBox, "x resolution", 'setValue'),
+            (self._pa.y_res_SpinBox, "y resolution", 'setValue'),
+            (self._pa.time_DoubleSpinBox, "time per pixel", 'setValue'),
+            (self._pa.rs_SpinBox, "return slowness", 'setValue'),
+            (self._pa.Comments_textEdit, "comment", 'setText'),
+            (self._pa.sweep_power_DoubleSpinBox, 'sweep_power', 'setValue'),
+            (self._pa.mw_start_DoubleSpinBox, 'mw_start', 'setValue'),
+            (self._pa.mw_stop_DoubleSpinBox, 'mw_stop', 'setValue'),
+            (self._pa.step_DoubleSpinBox, 'mw_step', 'setValue'),
+            (self._pa.min_fullb_DoubleSpinBox, 'min_fullb', 'setValue'),
+            (self._pa.max_fullb_DoubleSpinBox, 'max_fullb', 'setValue'),
+            (self._pa.number_sweeps_SpinBox, 'number_sweeps', 'setValue'),
+            (self._pa.step_hf_DoubleSpinBox, 'mw_step_hf', 'setValue'),
+            (self._pa.threshold_DoubleSpinBox, 'threshold', 'setValue'),
+            (self._pa.freq1_DoubleSpinBox, 'freq1', 'setValue'),
+            (self._pa.freq2_DoubleSpinBox, 'freq2', 'setValue'),
+            (self._pa.file_tag_lineEdit, "save tag", 'setText'),
+            (self._sc.pl_cb_ComboBox, "cmap pl", 'setCurrentText'),
+            (self._sc.topo_cb_ComboBox, "cmap topo", 'setCurrentText')]
+
+        # displayed data, set when the scanning tab is activated
+        self.image_pl_plot = None
+        self.image_topo_plot = None
+        self._image_pl_plot_buf = None
         
         # Send signals to logic
         self.sigStartScan.connect(self._magneto_logic.start_scanning, QtCore.Qt.QueuedConnection)
@@ -167,6 +198,8 @@ class NVScanningGui(GUIBase):
     def on_deactivate(self):
         """ Reverse steps of activation.
         """
+        # send the parameters edited just before closing to the logic
+        self.flush_pending_params()
         # save the params
         info_dict = self.gather_info_dict()
         with open(self.init_file_path, "wb") as f:
@@ -235,8 +268,9 @@ class NVScanningGui(GUIBase):
         self._pa.freq2_DoubleSpinBox.setMaximum(30e9)
                 
         # recall previously used values if existing
+        self._info_dict = None
         try:
-            self.recall_info_dict()
+            self._info_dict = self.recall_info_dict()
             h_range = self._pa.width_DoubleSpinBox.value()
             v_range = self._pa.height_DoubleSpinBox.value()
             self._pa.quenching_radioButton.setChecked(True)
@@ -274,25 +308,39 @@ class NVScanningGui(GUIBase):
         self._pa.isob_radioButton.clicked.connect(self.measmode_changed)
         self._pa.x_position_DoubleSpinBox.editingFinished.connect(self.check_scanner_position)
         self._pa.y_position_DoubleSpinBox.editingFinished.connect(self.check_scanner_position)  
-        self._pa.width_DoubleSpinBox.editingFinished.connect(self.change_range_params)
-        self._pa.height_DoubleSpinBox.editingFinished.connect(self.change_range_params)
-        self._pa.x_res_SpinBox.editingFinished.connect(self.change_resolution_params)
-        self._pa.y_res_SpinBox.editingFinished.connect(self.change_resolution_params)
-        self._pa.time_DoubleSpinBox.editingFinished.connect(self.change_time_params)
-        self._pa.rs_SpinBox.editingFinished.connect(self.change_rs_params)
         self._pa.hscan_radioButton.clicked.connect(self.scanmode_changed)
         self._pa.vscan_radioButton.clicked.connect(self.scanmode_changed)
-        self._pa.sweep_power_DoubleSpinBox.editingFinished.connect(self.change_power_params)
-        self._pa.mw_start_DoubleSpinBox.editingFinished.connect(self.change_fullb_params)
-        self._pa.mw_stop_DoubleSpinBox.editingFinished.connect(self.change_fullb_params)
-        self._pa.min_fullb_DoubleSpinBox.editingFinished.connect(self.change_fullb_params)
-        self._pa.max_fullb_DoubleSpinBox.editingFinished.connect(self.change_fullb_params)
-        self._pa.step_DoubleSpinBox.editingFinished.connect(self.change_fullb_params)
-        self._pa.step_hf_DoubleSpinBox.editingFinished.connect(self.change_fullb_params)
-        self._pa.number_sweeps_SpinBox.editingFinished.connect(self.change_fullb_params)
-        self._pa.threshold_DoubleSpinBox.editingFinished.connect(self.change_fullb_params)
-        self._pa.freq1_DoubleSpinBox.editingFinished.connect(self.change_isob_params)
-        self._pa.freq2_DoubleSpinBox.editingFinished.connect(self.change_isob_params)
+
+        # Edited parameters are gathered and sent to the logic once per group
+        # when no other edit happened for a short time
+        self._pending_params = []
+        self._pending_params_timer = QtCore.QTimer()
+        self._pending_params_timer.setSingleShot(True)
+        self._pending_params_timer.setInterval(80)
+        self._pending_params_timer.timeout.connect(self.flush_pending_params)
+        param_widgets = (
+            (self.change_range_params, (self._pa.width_DoubleSpinBox,
+                                        self._pa.height_DoubleSpinBox)),
+            (self.change_resolution_params, (self._pa.x_res_SpinBox,
+                                             self._pa.y_res_SpinBox)),
+            (self.change_time_params, (self._pa.time_DoubleSpinBox,)),
+            (self.change_rs_params, (self._pa.rs_SpinBox,)),
+            (self.change_power_params, (self._pa.sweep_power_DoubleSpinBox,)),
+            (self.change_fullb_params, (self._pa.mw_start_DoubleSpinBox,
+                                        self._pa.mw_stop_DoubleSpinBox,
+                                        self._pa.min_fullb_DoubleSpinBox,
+                                        self._pa.max_fullb_DoubleSpinBox,
+                                        self._pa.step_DoubleSpinBox,
+                                        self._pa.step_hf_DoubleSpinBox,
+                                        self._pa.number_sweeps_SpinBox,
+                                        self._pa.threshold_DoubleSpinBox)),
+            (self.change_isob_params, (self._pa.freq1_DoubleSpinBox,
+                                       self._pa.freq2_DoubleSpinBox)),
+            )
+        for change_method, widgets in param_widgets:
+            for widget in widgets:
+                widget.editingFinished.connect(
+                    lambda change_method=change_method: self.queue_param_change(change_method))
         
         self._magneto_logic.initialize_image(4, 4) # default quenching on start
         
@@ -319,10 +367,14 @@ class NVScanningGui(GUIBase):
     
         # Initialize the ComboBoxes for the colormap choice
         self.cdict = cdef.colordict
+        self._cmap_cache = {}
         self._sc.pl_cb_ComboBox.addItems(self.cdict.keys())
         self._sc.topo_cb_ComboBox.addItems(self.cdict.keys())
 
-        self.recall_info_dict() # we cannot get the right colors otherwise
+        # the colormaps can only be recalled once the comboBoxes are filled
+        if self._info_dict is not None:
+            self._sc.pl_cb_ComboBox.setCurrentText(self._info_dict.get("cmap pl", ""))
+            self._sc.topo_cb_ComboBox.setCurrentText(self._info_dict.get("cmap topo", ""))
         if self._sc.pl_cb_ComboBox.currentText() == "":
             index_combobox = self._sc.pl_cb_ComboBox.findText("Inferno")
             self._sc.pl_cb_ComboBox.setCurrentIndex(index_combobox)
@@ -330,17 +382,45 @@ class NVScanningGui(GUIBase):
             index_combobox = self._sc.topo_cb_ComboBox.findText("Gray")
             self._sc.topo_cb_ComboBox.setCurrentIndex(index_combobox)
 
-        # Initialize the ComboBoxes for the plot choice
+        # Initialize the ComboBoxes for the plot choice, their texts are cached
+        # so that the plot refresh does not query the widgets
+        self._image_disp_text = self._sc.image_disp_comboBox.currentText()
+        self._line_disp_text = self._sc.line_disp_comboBox.currentText()
+        self._sc.image_disp_comboBox.currentTextChanged.connect(self._on_image_disp_changed)
+        self._sc.line_disp_comboBox.currentTextChanged.connect(self._on_line_disp_changed)
         self.set_comboBoxes()
 
+        # Data to plot for each measurement mode and image_disp_comboBox text:
+        # (pl_image index, scanline slice, colorbar text, unit, colorbar suffix)
+        # '_default' is used when the text is not in the mode's table.
+        self._plot_dispatch = {
+            'quenching': {
+                '_default': (3, slice(2, 4), 'PL', 'counts/s', None),
+                },
+            'isob': {
+                'PL diff': (3, slice(2, 4), 'PL diff', 'counts/s', None),
+                'PL1': (4, slice(4, 6), 'PL1', 'counts/s', None),
+                'PL2': (5, slice(6, 8), 'PL2', 'counts/s', None),
+                },
+            'fullb': {
+                'Freq': (3, slice(2, 4), 'Freq shift', 'Hz', 'Hz'),
+                'PL diff': (4, slice(4, 6), 'PL diff', 'counts/s', 'c'),
+                'PL1': (5, slice(6, 8), 'PL1', 'counts/s', 'c'),
+                'PL2': (6, slice(8, 10), 'PL2', 'counts/s', None),
+                },
+            }
+        self._plot_dispatch['isob']['_default'] = self._plot_dispatch['isob']['PL1']
+        self._plot_dispatch['fullb']['_default'] = self._plot_dispatch['fullb']['PL1']
+
         ## Load displays
         # Get images from the logic and load it in the displays
-        topo_raw_data = self._magneto_logic.pl_image[:, :, 2]
+        self.image_topo_plot = self._magneto_logic.pl_image[:, :, 2]
         self.image_pl_plot = self._magneto_logic.pl_image[:, :, 3]
         h_range = self._pa.width_DoubleSpinBox.value()
         v_range = self._pa.height_DoubleSpinBox.value()
 
         # Update x and y axis
+        self._last_plot_cfg = None # last (mode, display, rect) applied in update_plots
         self.pl_image = pg.ImageItem(image=self.image_pl_plot, axisOrder='row-major')
         self.pl_image.setRect(QtCore.QRectF(
             self._magneto_logic.current_position[0] - h_range * 0.5,
@@ -348,7 +428,7 @@ class NVScanningGui(GUIBase):
             h_range,
             v_range
             ))
-        self.topo_image = pg.ImageItem(image=topo_raw_data, axisOrder='row-major')
+        self.topo_image = pg.ImageItem(image=self.image_topo_plot, axisOrder='row-major')
         self.topo_image.setRect(QtCore.QRectF(
             self._magneto_logic.current_position[0] - h_range * 0.5,
             self._magneto_logic.current_position[1] - v_range * 0.5,
@@ -356,6 +436,9 @@ class NVScanningGui(GUIBase):
             v_range
             ))
     
+        # arrays last given to the image items, the data only changes through update_plots
+        self._displayed_images = {'pl': self.image_pl_plot, 'topo': self.image_topo_plot}
+
         self._sc.pl_ViewWidget.addItem(self.pl_image)
         self._sc.pl_ViewWidget.setAspectLocked(True) # for rectangular scans
         self._sc.topo_ViewWidget.addItem(self.topo_image)
@@ -368,11 +451,13 @@ class NVScanningGui(GUIBase):
         self._sc.topo_ViewWidget.setLabel('left', 'Y position', units='m')
     
         # Set colorscales
-        self.my_colors_pl = self.cdict[self._sc.pl_cb_ComboBox.currentText()]()
+        self.my_colors_pl = self.get_cmap(self._sc.pl_cb_ComboBox.currentText())
         self.pl_image.setLookupTable(self.my_colors_pl.lut)
+        self._pl_lut = self.my_colors_pl.lut # lut currently set in the image item
     
-        self.my_colors_topo = self.cdict[self._sc.topo_cb_ComboBox.currentText()]()
+        self.my_colors_topo = self.get_cmap(self._sc.topo_cb_ComboBox.currentText())
         self.topo_image.setLookupTable(self.my_colors_topo.lut)
+        self._topo_lut = self.my_colors_topo.lut
 
         # Set colorbar and add it to ViewWidget
         cb_range = [0, 1e6]
@@ -479,6 +564,20 @@ class NVScanningGui(GUIBase):
         return
     
 
+    def _on_image_disp_changed(self, text):
+        """ Cache the text of the image display comboBox.
+        @param str: text, new current text of the comboBox
+        """
+        self._image_disp_text = text
+
+
+    def _on_line_disp_changed(self, text):
+        """ Cache the text of the line display comboBox.
+        @param str: text, new current text of the comboBox
+        """
+        self._line_disp_text = text
+
+
     def disable_action(self, lock_odmr=False):
         """ Disable all the possible actions while scanning.
         @params: lock_odmr, bool, True if we are just disabling
@@ -568,6 +667,7 @@ class NVScanningGui(GUIBase):
     def start_scanning(self):
         """ Prepare the GUI for the scan.
         """
+        self.flush_pending_params()
         test = self.check_aspect_ratio()
         if test:
             self.disable_action()
@@ -599,6 +699,7 @@ class NVScanningGui(GUIBase):
     def resume_scanning(self):
         """ Prepare the GUI for the scan.
         """
+        self.flush_pending_params()
         self.disable_action()
         x = self._pa.x_position_DoubleSpinBox.value()
         y = self._pa.y_position_DoubleSpinBox.value()
@@ -670,8 +771,8 @@ class NVScanningGui(GUIBase):
         x = self._pa.x_position_DoubleSpinBox.value()
         y = self._pa.y_position_DoubleSpinBox.value()
         self._magneto_logic.center_position = [x, y]
-        if np.abs(x- self._magneto_logic.current_position[0])>self._magneto_logic.return_slowness\
-            or np.abs(y- self._magneto_logic.current_position[1])>self._magneto_logic.return_slowness:
+        if abs(x- self._magneto_logic.current_position[0])>self._magneto_logic.return_slowness\
+            or abs(y- self._magneto_logic.current_position[1])>self._magneto_logic.return_slowness:
             self.log.info("Scanner not yet at the desired position.")
             self._mw.actionStart.setEnabled(False)
             result = False
@@ -697,17 +798,16 @@ class NVScanningGui(GUIBase):
         scan_ratio = x_range/y_range
         res_ratio = px_x/px_y
         
-        if np.abs(scan_ratio-res_ratio)>5e-2:    
+        if abs(scan_ratio-res_ratio)>5e-2:    
             new_x_res = px_x
-            new_y_res = int(np.ceil(px_x/scan_ratio))
-            messagebox = QtGui.QMessageBox()
-            messagebox.setText("Your pixels are not square. Choose cancel if you do not care."
-                               +"If you choose OK, the "
-                               +"resolution will be modified to {:d}x{:d}px.".format(
-                                       new_x_res, new_y_res))
-            messagebox.setStandardButtons(QtGui.QMessageBox.Ok | QtGui.QMessageBox.Cancel)
-            messagebox.setWindowTitle("Warning")
-            answer = messagebox.exec_()
+            new_y_res = math.ceil(px_x/scan_ratio)
+            answer = QtGui.QMessageBox.warning(
+                self._mw,
+                "Warning",
+                "Your pixels are not square. Choose cancel if you do not care."
+                +"If you choose OK, the "
+                +"resolution will be modified to {:d}x{:d}px.".format(new_x_res, new_y_res),
+                QtGui.QMessageBox.Ok | QtGui.QMessageBox.Cancel)
             if answer == QtGui.QMessageBox.Ok:
                 self._pa.x_res_SpinBox.setValue(new_x_res)
                 self._pa.y_res_SpinBox.setValue(new_y_res)
@@ -780,6 +880,28 @@ class NVScanningGui(GUIBase):
         return
 
 
+    def queue_param_change(self, change_method):
+        """ Register a parameter group to be sent to the logic and (re)start the
+        timer sending all the registered groups.
+
+        @params method: change_method, one of the change_*_params methods
+        """
+        if change_method not in self._pending_params:
+            self._pending_params.append(change_method)
+        self._pending_params_timer.start()
+        return
+
+
+    def flush_pending_params(self):
+        """ Send every registered parameter group once to the logic.
+        """
+        self._pending_params_timer.stop()
+        pending_params, self._pending_params = self._pending_params, []
+        for change_method in pending_params:
+            change_method()
+        return
+
+
     def update_parameters(self, param_dict):
         """ Update the parameter display in the GUI.
 
@@ -788,83 +910,36 @@ class NVScanningGui(GUIBase):
         The update will block the GUI signals from emitting a change back to the
         logic.
         """
-        param = param_dict.get('clock_frequency')
-        if param is not None:
-            self._pa.time_DoubleSpinBox.blockSignals(True)
-            self._pa.time_DoubleSpinBox.setValue(1.0/param)
-            self._pa.time_DoubleSpinBox.blockSignals(False)
-        
-        param = param_dict.get('x_range')
-        if param is not None:
-            self._pa.width_DoubleSpinBox.blockSignals(True)
-            self._pa.width_DoubleSpinBox.setValue(param[1]-param[0])
-            self._pa.width_DoubleSpinBox.blockSignals(False)
-
-        param = param_dict.get('y_range')
-        if param is not None:
-            self._pa.height_DoubleSpinBox.blockSignals(True)
-            self._pa.height_DoubleSpinBox.setValue(param[1]-param[0])
-            self._pa.height_DoubleSpinBox.blockSignals(False)
-            
-        param = param_dict.get('x_resolution')
-        if param is not None:
-            self._pa.x_res_SpinBox.blockSignals(True)
-            self._pa.x_res_SpinBox.setValue(param)
-            self._pa.x_res_SpinBox.blockSignals(False)
-            
-        param = param_dict.get('y_resolution')
-        if param is not None:
-            self._pa.y_res_SpinBox.blockSignals(True)
-            self._pa.y_res_SpinBox.setValue(param)
-            self._pa.y_res_SpinBox.blockSignals(False)
-            
-        param = param_dict.get('return_slowness')
-        if param is not None:
-            self._pa.rs_SpinBox.blockSignals(True)
-            self._pa.rs_SpinBox.setValue(param)
-            self._pa.rs_SpinBox.blockSignals(False)
-            
-        param = param_dict.get('sweep_mw_power')
-        if param is not None:
-            self._pa.sweep_power_DoubleSpinBox.blockSignals(True)
-            self._pa.sweep_power_DoubleSpinBox.setValue(param)
-            self._pa.sweep_power_DoubleSpinBox.blockSignals(False)
-            
-        param = param_dict.get('mw_start')
-        if param is not None:
-            self._pa.mw_start_DoubleSpinBox.blockSignals(True)
-            self._pa.mw_start_DoubleSpinBox.setValue(param)
-            self._pa.mw_start_DoubleSpinBox.blockSignals(False)
-            
-        param = param_dict.get('mw_stop')
-        if param is not None:
-            self._pa.mw_stop_DoubleSpinBox.blockSignals(True)
-            self._pa.mw_stop_DoubleSpinBox.setValue(param)
-            self._pa.mw_stop_DoubleSpinBox.blockSignals(False)
-            
-        param = param_dict.get('mw_step')
-        if param is not None and self._step_state:
-            self._pa.step_DoubleSpinBox.blockSignals(True)
-            self._pa.step_DoubleSpinBox.setValue(param)
-            self._pa.step_DoubleSpinBox.blockSignals(False)
-            
-        param = param_dict.get('number_sweeps')
-        if param is not None:
-            self._pa.number_sweeps_SpinBox.blockSignals(True)
-            self._pa.number_sweeps_SpinBox.setValue(param)
-            self._pa.number_sweeps_SpinBox.blockSignals(False)
-            
-        param = param_dict.get('freq1')
-        if param is not None:
-            self._pa.freq1_DoubleSpinBox.blockSignals(True)
-            self._pa.freq1_DoubleSpinBox.setValue(param)
-            self._pa.freq1_DoubleSpinBox.blockSignals(False)
-            
-        param = param_dict.get('freq2')
-        if param is not None:
-            self._pa.freq2_DoubleSpinBox.blockSignals(True)
-            self._pa.freq2_DoubleSpinBox.setValue(param)
-            self._pa.freq2_DoubleSpinBox.blockSignals(False)
+        # (spinbox, conversion from the logic value to the displayed value)
+        spinbox_params = {
+            'clock_frequency': (self._pa.time_DoubleSpinBox, lambda param: 1.0/param),
+            'x_range': (self._pa.width_DoubleSpinBox, lambda param: param[1]-param[0]),
+            'y_range': (self._pa.height_DoubleSpinBox, lambda param: param[1]-param[0]),
+            'x_resolution': (self._pa.x_res_SpinBox, None),
+            'y_resolution': (self._pa.y_res_SpinBox, None),
+            'return_slowness': (self._pa.rs_SpinBox, None),
+            'sweep_mw_power': (self._pa.sweep_power_DoubleSpinBox, None),
+            'mw_start': (self._pa.mw_start_DoubleSpinBox, None),
+            'mw_stop': (self._pa.mw_stop_DoubleSpinBox, None),
+            'number_sweeps': (self._pa.number_sweeps_SpinBox, None),
+            'freq1': (self._pa.freq1_DoubleSpinBox, None),
+            'freq2': (self._pa.freq2_DoubleSpinBox, None),
+            }
+        if self._step_state:
+            spinbox_params['mw_step'] = (self._pa.step_DoubleSpinBox, None)
+
+        # the spinboxes are repainted once after all the changes
+        self._pa.setUpdatesEnabled(False)
+        try:
+            for key, (spinbox, convert) in spinbox_params.items():
+                param = param_dict.get(key)
+                if param is None:
+                    continue
+                spinbox.blockSignals(True)
+                spinbox.setValue(param if convert is None else convert(param))
+                spinbox.blockSignals(False)
+        finally:
+            self._pa.setUpdatesEnabled(True)
             
         param = param_dict.get('x')
         if param is not None:
@@ -975,48 +1050,67 @@ class NVScanningGui(GUIBase):
                                      PL2_scanline] if fullb 
         @params np.ndarray: esrline, empty array if not in fullb mode, [freq, PL]
         """
-        topo_image = pl_image[:, :, 2]
-        topo_scanline = scanline[:, 0:2]
-        cb_range = self.get_cb_range(topo_image, "topo")
-        
-        self.topo_image.setImage(image=topo_image, levels=(cb_range[0], cb_range[1]))
-        self.topo_scanline.setData(topo_scanline)
-        if self.scanmode == "_hpix":
-            self._sc.topo_scanline_ViewWidget.setLabel('bottom', 'X position', units='m')
-        else: 
-            self._sc.topo_scanline_ViewWidget.setLabel('bottom', 'Y position', units='m')        
-        self.refresh_colorbar('topo')
-
-        image_temp, scanline_temp = self.get_data_to_plot(pl_image, scanline, esr_line)
-        cb_range = self.get_cb_range(image_temp, "pl")
-        self.pl_image.setImage(image=image_temp, levels=(cb_range[0], cb_range[1]))
-        self.pl_scanline.setData(scanline_temp)
-        if self._sc.image_disp_comboBox.currentText() == "Freq":
-            self._sc.pl_scanline_ViewWidget.setLabel('left', 'Frequency', units='Hz')
-        if self._sc.line_disp_comboBox.currentText() == "ESR spectrum":
-            self._sc.pl_scanline_ViewWidget.setLabel('bottom', 'Frequency', units='Hz')
-            self._sc.pl_scanline_ViewWidget.setLabel('left', 'PL', units='counts/s')
-        elif self.scanmode == "_hpix":
-            self._sc.pl_scanline_ViewWidget.setLabel('bottom', 'X position', units='m')
-        else: 
-            self._sc.pl_scanline_ViewWidget.setLabel('bottom', 'Y position', units='m')
-        self.refresh_colorbar('pl')
-
-        # update x and y axis
+        image_disp_text = self._image_disp_text
+        line_disp_text = self._line_disp_text
         h_range = self._pa.width_DoubleSpinBox.value()
         v_range = self._pa.height_DoubleSpinBox.value()
-        self.pl_image.setRect(QtCore.QRectF(
-                self._pa.x_position_DoubleSpinBox.value() - h_range * 0.5,
-                self._pa.y_position_DoubleSpinBox.value() - v_range * 0.5,
-                h_range,
-                v_range
-                ))
-        self.topo_image.setRect(QtCore.QRectF(
-                self._pa.x_position_DoubleSpinBox.value() - h_range * 0.5,
-                self._pa.y_position_DoubleSpinBox.value() - v_range * 0.5,
-                h_range,
-                v_range
-                ))
+        x_pos = self._pa.x_position_DoubleSpinBox.value()
+        y_pos = self._pa.y_position_DoubleSpinBox.value()
+        # labels and rects only need to be set again if one of these changed,
+        # the image shape is needed since setRect scales with the image size
+        plot_cfg = (self.scanmode, image_disp_text, line_disp_text,
+                    h_range, v_range, x_pos, y_pos, pl_image.shape[:2])
+        cfg_changed = plot_cfg != self._last_plot_cfg
+
+        # the widgets only queue their changes, the tab is repainted once at the end
+        self._sc.setUpdatesEnabled(False)
+        try:
+            self.image_topo_plot = pl_image[:, :, 2]
+            topo_scanline = scanline[:, 0:2]
+            cb_range = self.get_cb_range(self.image_topo_plot, "topo")
+        
+            self.set_image('topo', self.image_topo_plot, (cb_range[0], cb_range[1]))
+            self.topo_scanline.setData(topo_scanline)
+            if cfg_changed:
+                if self.scanmode == "_hpix":
+                    self._sc.topo_scanline_ViewWidget.setLabel('bottom', 'X position', units='m')
+                else: 
+                    self._sc.topo_scanline_ViewWidget.setLabel('bottom', 'Y position', units='m')
+            self.refresh_colorbar('topo')
+
+            image_temp, scanline_temp = self.get_data_to_plot(pl_image, scanline, esr_line)
+            cb_range = self.get_cb_range(image_temp, "pl")
+            self.set_image('pl', image_temp, (cb_range[0], cb_range[1]))
+            self.pl_scanline.setData(scanline_temp)
+            if cfg_changed:
+                if image_disp_text == "Freq":
+                    self._sc.pl_scanline_ViewWidget.setLabel('left', 'Frequency', units='Hz')
+                if line_disp_text == "ESR spectrum":
+                    self._sc.pl_scanline_ViewWidget.setLabel('bottom', 'Frequency', units='Hz')
+                    self._sc.pl_scanline_ViewWidget.setLabel('left', 'PL', units='counts/s')
+                elif self.scanmode == "_hpix":
+                    self._sc.pl_scanline_ViewWidget.setLabel('bottom', 'X position', units='m')
+                else: 
+                    self._sc.pl_scanline_ViewWidget.setLabel('bottom', 'Y position', units='m')
+            self.refresh_colorbar('pl')
+
+            # update x and y axis
+            if cfg_changed:
+                self.pl_image.setRect(QtCore.QRectF(
+                        x_pos - h_range * 0.5,
+                        y_pos - v_range * 0.5,
+                        h_range,
+                        v_range
+                        ))
+                self.topo_image.setRect(QtCore.QRectF(
+                        x_pos - h_range * 0.5,
+                        y_pos - v_range * 0.5,
+                        h_range,
+                        v_range
+                        ))
+                self._last_plot_cfg = plot_cfg
+        finally:
+            self._sc.setUpdatesEnabled(True)
         return
         
     
@@ -1034,98 +1128,107 @@ class NVScanningGui(GUIBase):
         @return np.ndarray: self.image_pl_plot
         @return np.ndarray: scanline_temp
         """
-        if self.measmode == "quenching":
-            self.image_pl_plot = pl_image[:, :, 3]
-            scanline_temp = scanline[:, 2:4]
-            self.pl_plot_text = "PL"
-            self.pl_plot_unit = "counts/s"
-            
-        elif self.measmode == "isob":
-            self.pl_plot_unit = "counts/s"
-            if self._sc.image_disp_comboBox.currentText() == "PL diff":
-                self.image_pl_plot = pl_image[:, :, 3]
-                scanline_temp = scanline[:, 2:4]
-                self.pl_plot_text = "PL diff"
-            elif self._sc.image_disp_comboBox.currentText() == "PL1":
-                self.image_pl_plot = pl_image[:, :, 4]
-                scanline_temp = scanline[:, 4:6]
-                self.pl_plot_text = "PL1"
-            elif self._sc.image_disp_comboBox.currentText() == "PL2":
-                self.image_pl_plot = pl_image[:, :, 5]
-                scanline_temp = scanline[:, 6:8]
-                self.pl_plot_text = "PL2"
-        else:
-            if self._sc.image_disp_comboBox.currentText() == "Freq":
-                self.image_pl_plot = pl_image[:, :, 3]
-                scanline_temp = scanline[:, 2:4]
-                self.pl_plot_text = "Freq shift"
-                self.pl_plot_unit = "Hz"
-                self._sc.pl_cb_min_DoubleSpinBox.setSuffix("Hz")
-                self._sc.pl_cb_max_DoubleSpinBox.setSuffix("Hz")
-            elif self._sc.image_disp_comboBox.currentText() == "PL diff":
-                self.image_pl_plot = pl_image[:, :, 4]
-                scanline_temp = scanline[:, 4:6]
-                self.pl_plot_text = "PL diff"
-                self.pl_plot_unit = "counts/s"
-                self._sc.pl_cb_min_DoubleSpinBox.setSuffix("c")
-                self._sc.pl_cb_max_DoubleSpinBox.setSuffix("c")
-            elif self._sc.image_disp_comboBox.currentText() == "PL1":
-                self.image_pl_plot = pl_image[:, :, 5]
-                scanline_temp = scanline[:, 6:8]
-                self.pl_plot_text = "PL1"
-                self.pl_plot_unit = "counts/s"
-                self._sc.pl_cb_min_DoubleSpinBox.setSuffix("c")
-                self._sc.pl_cb_max_DoubleSpinBox.setSuffix("c")
-            elif self._sc.image_disp_comboBox.currentText() == "PL2":
-                self.image_pl_plot = pl_image[:, :, 6]
-                scanline_temp = scanline[:, 8:10]
-                self.pl_plot_text = "PL2"
-                self.pl_plot_unit = "counts/s"
-            if self._sc.line_disp_comboBox.currentText() == "ESR spectrum":
-                scanline_temp = esr_line
-      
+        mode_dispatch = self._plot_dispatch[self.measmode]
+        index, line_slice, self.pl_plot_text, self.pl_plot_unit, suffix = mode_dispatch.get(
+            self._image_disp_text, mode_dispatch['_default'])
+        # the channel is copied into a contiguous buffer, reused as long as the
+        # resolution does not change, so that the colorbar range and the image
+        # rendering do not read the strided view of pl_image. It stays float64,
+        # the frequencies (~2.87e9 Hz) would be rounded to 256 Hz in float32.
+        image_view = pl_image[:, :, index]
+        if self._image_pl_plot_buf is None or self._image_pl_plot_buf.shape != image_view.shape:
+            self._image_pl_plot_buf = np.empty(image_view.shape, dtype=np.float64)
+        np.copyto(self._image_pl_plot_buf, image_view)
+        self.image_pl_plot = self._image_pl_plot_buf
+        scanline_temp = scanline[:, line_slice]
+        if suffix is not None:
+            self._sc.pl_cb_min_DoubleSpinBox.setSuffix(suffix)
+            self._sc.pl_cb_max_DoubleSpinBox.setSuffix(suffix)
+        if self.measmode == "fullb" and self._line_disp_text == "ESR spectrum":
+            scanline_temp = esr_line
+
         return self.image_pl_plot, scanline_temp
         
 
     def refresh_pl_image(self):
         """ Update the pl image when the cb manually changes.
         """
-        try: #we get troubles at the init when pl_image is not defined
-            cb_range = self.get_cb_range(self.image_pl_plot, 'pl')
-            # change colors
-            self.my_colors_pl = self.cdict[self._sc.pl_cb_ComboBox.currentText()]()
+        if self.image_pl_plot is None:
+            # called during the init, the image is not displayed yet
+            return
+        cb_range = self.get_cb_range(self.image_pl_plot, 'pl')
+        # change colors
+        self.my_colors_pl = self.get_cmap(self._sc.pl_cb_ComboBox.currentText())
+        if self.my_colors_pl.lut is not self._pl_lut:
             self.pl_image.setLookupTable(self.my_colors_pl.lut)
-        
-            # change image
-            self.pl_image.setImage(image=self.image_pl_plot, levels=(cb_range[0], cb_range[1]))
-        
-            # change colorbar
-            self.refresh_colorbar("pl")
-        except:
-            self.log.warning('Could not refresh the image.')
+            self._pl_lut = self.my_colors_pl.lut
+    
+        # change image
+        self.set_image('pl', self.image_pl_plot, (cb_range[0], cb_range[1]), new_data=False)
+    
+        # change colorbar
+        self.refresh_colorbar("pl")
         return
 
 
     def refresh_topo_image(self):
         """ Update the topo image when the cb manually changes.
         """
-        
-        try: #we get troubles at the init when topo_image is not defined
-            image_temp = self._magneto_logic.pl_image[:, :, 2]
-            cb_range = self.get_cb_range(image_temp, 'topo')
-            # change colors
-            self.my_colors_topo = self.cdict[self._sc.topo_cb_ComboBox.currentText()]()
+        if self.image_topo_plot is None:
+            # called during the init, the image is not displayed yet
+            return
+        if self.image_topo_plot.base is not self._magneto_logic.pl_image:
+            # the logic allocated a new image since the last display
+            self.image_topo_plot = self._magneto_logic.pl_image[:, :, 2]
+        image_temp = self.image_topo_plot
+        cb_range = self.get_cb_range(image_temp, 'topo')
+        # change colors
+        self.my_colors_topo = self.get_cmap(self._sc.topo_cb_ComboBox.currentText())
+        if self.my_colors_topo.lut is not self._topo_lut:
             self.topo_image.setLookupTable(self.my_colors_topo.lut)
-        
-            # change image
-            self.topo_image.setImage(image=image_temp, levels=(cb_range[0], cb_range[1]))
-        
-            # change colorbar
-            self.refresh_colorbar("topo")
-        except:
-            self.log.warning('Could not refresh the topo image.')
+            self._topo_lut = self.my_colors_topo.lut
+    
+        # change image
+        self.set_image('topo', image_temp, (cb_range[0], cb_range[1]), new_data=False)
+    
+        # change colorbar
+        self.refresh_colorbar("topo")
         return
     
+    def get_cmap(self, name):
+        """ Get the color scale of the given name, it is only built the first time.
+
+        @params str: name, key of the color scale in self.cdict
+        @return ColorScale: color scale with the lut and normed colormap
+        """
+        cmap = self._cmap_cache.get(name)
+        if cmap is None:
+            cmap = self.cdict[name]()
+            self._cmap_cache[name] = cmap
+        return cmap
+
+
+    def set_image(self, mode, image, levels, new_data=True):
+        """ Display an image with the given colorbar levels.
+
+        If the data did not change since the array was displayed, only the
+        levels are changed, which avoids remapping all the pixels with setImage.
+        The array itself is compared since the image item only keeps a view of it.
+
+        @params str: mode, 'pl' or 'topo'
+        @params np.ndarray: image, data to display
+        @params tuple: levels, (cb_min, cb_max)
+        @params bool: new_data, False if the data of a displayed array did not change
+        """
+        image_item = self.topo_image if mode == 'topo' else self.pl_image
+        if not new_data and self._displayed_images[mode] is image:
+            image_item.setLevels(levels)
+        else:
+            image_item.setImage(image=image, levels=levels)
+            self._displayed_images[mode] = image
+        return
+
+
     def correct_topo(self, corr_fct):
         """ Correct the topography in the scan
         """
@@ -1195,12 +1298,8 @@ class NVScanningGui(GUIBase):
             for v in val:
                 strings.append(ax.tickStrings(v[1], scale, v[0]))
             
-            newt = []
-            for j in range(len(val)):
-                level = []
-                for i, v in enumerate(val[j][1]):
-                    level.append((v*coeff, strings[j][i]))
-                newt.append(level)
+            newt = [list(zip((np.asarray(v[1], dtype=np.float64)*coeff).tolist(), strings[j]))
+                    for j, v in enumerate(val)]
             ax.setTicks(newt)
             ax.setLabel(text=text, units=unit, unitPrefix=prefix)
 
@@ -1213,47 +1312,29 @@ class NVScanningGui(GUIBase):
         @params np.ndarray: image, data to plot
         @params str: 'pl' or 'topo', to indicate which plotwidget needs to be used.
         """
-        try:
-            nonzero_image = image[np.nonzero(image)] # we do not consider the areas unscanned
-            if mode == 'topo':
-                if not self._sc.topo_manual_checkBox.isChecked():
-                    cb_min = np.min(nonzero_image)
-                    cb_max = np.max(image)
-                    self._sc.topo_cb_min_DoubleSpinBox.setValue(cb_min)
-                    self._sc.topo_cb_max_DoubleSpinBox.setValue(cb_max)
-                else:
-                    cb_min = self._sc.topo_cb_min_DoubleSpinBox.value()
-                    cb_max = self._sc.topo_cb_max_DoubleSpinBox.value()
-            else:
-                if not self._sc.pl_manual_checkBox.isChecked():
-                    cb_min = np.min(nonzero_image)
-                    cb_max = np.max(image)
-                    self._sc.pl_cb_min_DoubleSpinBox.setValue(cb_min)
-                    self._sc.pl_cb_max_DoubleSpinBox.setValue(cb_max)
-                else:
-                    cb_min = self._sc.pl_cb_min_DoubleSpinBox.value()
-                    cb_max = self._sc.pl_cb_max_DoubleSpinBox.value()
-            
-            cb_range = [cb_min, cb_max]
-            return cb_range
-        
-        except:
-            if mode == 'topo':
-                if not self._sc.topo_manual_checkBox.isChecked():
-                    cb_min = np.min(image)
-                    cb_max = np.max(image)
-                else:
-                    cb_min = self._sc.topo_cb_min_DoubleSpinBox.value()
-                    cb_max = self._sc.topo_cb_max_DoubleSpinBox.value()
-            else:
-                if not self._sc.pl_manual_checkBox.isChecked():
-                    cb_min = np.min(image)
-                    cb_max = np.max(image)
-                else:
-                    cb_min = self._sc.pl_cb_min_DoubleSpinBox.value()
-                    cb_max = self._sc.pl_cb_max_DoubleSpinBox.value()
-            cb_range = [cb_min, cb_max]
-            return cb_range
+        if mode == 'topo':
+            manual = self._sc.topo_manual_checkBox.isChecked()
+            min_spinbox = self._sc.topo_cb_min_DoubleSpinBox
+            max_spinbox = self._sc.topo_cb_max_DoubleSpinBox
+        else:
+            manual = self._sc.pl_manual_checkBox.isChecked()
+            min_spinbox = self._sc.pl_cb_min_DoubleSpinBox
+            max_spinbox = self._sc.pl_cb_max_DoubleSpinBox
+
+        if manual:
+            return [min_spinbox.value(), max_spinbox.value()]
+
+        mask = image != 0 # we do not consider the areas unscanned
+        if not mask.any():
+            # nothing scanned yet, the image only contains zeros
+            return [0.0, 0.0]
+
+        cb_min = float(image[mask].min())
+        cb_max = float(image.max())
+        min_spinbox.setValue(cb_min)
+        max_spinbox.setValue(cb_max)
+        cb_range = [cb_min, cb_max]
+        return cb_range
 
 
     def update_roi_from_user(self, roi):
@@ -1325,52 +1406,35 @@ class NVScanningGui(GUIBase):
         with open(self.init_file_path, "rb") as f: 
             info_dict = pickle.load(f)
             
-        self._pa.x_position_DoubleSpinBox.setValue(info_dict["x center position"])
-        self._pa.y_position_DoubleSpinBox.setValue(info_dict["y center position"])
-        self._pa.width_DoubleSpinBox.setValue(info_dict["scan width"])
-        self._pa.height_DoubleSpinBox.setValue(info_dict["scan height"])
-        self.change_range_params(init=True)      
-        self._pa.x_res_SpinBox.setValue(info_dict["x resolution"])
-        self._pa.y_res_SpinBox.setValue(info_dict["y resolution"])
-        self.change_resolution_params()
-        
-        self._pa.time_DoubleSpinBox.setValue(info_dict["time per pixel"])
+        # set all the widgets without triggering their signals, the parameters
+        # are then sent once to the logic. Keys missing from older init files
+        # leave the widget unchanged.
+        widgets = [widget for widget, _, _ in self._recall_table]
+        widgets += [self._pa.hscan_radioButton, self._pa.vscan_radioButton]
+        was_blocked = [widget.blockSignals(True) for widget in widgets]
+        try:
+            for widget, key, setter in self._recall_table:
+                if key in info_dict:
+                    getattr(widget, setter)(info_dict[key])
+            if "scan mode" in info_dict:
+                if info_dict["scan mode"] == "_h":
+                    self._pa.hscan_radioButton.setChecked(True)
+                else:
+                    self._pa.vscan_radioButton.setChecked(True)
+        finally:
+            for widget, blocked in zip(widgets, was_blocked):
+                widget.blockSignals(blocked)
+
+        self.max_scanner = info_dict.get("max scanner", self.max_scanner)
+
+        # send each parameter group once, scanmode_changed also sends the resolution
+        self.change_range_params(init=True)
+        self.scanmode_changed()
         self.change_time_params()
-        
-        self._pa.rs_SpinBox.setValue(info_dict["return slowness"])
         self.change_rs_params()
-        
-        self._pa.Comments_textEdit.setText(info_dict["comment"])
-       
-        if info_dict["scan mode"] == "_h":
-            self._pa.hscan_radioButton.setChecked(True)
-        else:
-            self._pa.vscan_radioButton.setChecked(True)
-        self.scanmode_changed()
-        
-        self._pa.sweep_power_DoubleSpinBox.setValue(info_dict['sweep_power'])
         self.change_power_params()
-        
-        self._pa.mw_start_DoubleSpinBox.setValue(info_dict['mw_start'])
-        self._pa.mw_stop_DoubleSpinBox.setValue(info_dict['mw_stop'])
-        self._pa.step_DoubleSpinBox.setValue(info_dict['mw_step'])
-        self._pa.min_fullb_DoubleSpinBox.setValue(info_dict['min_fullb'])
-        self._pa.max_fullb_DoubleSpinBox.setValue(info_dict['max_fullb'])
-        self._pa.number_sweeps_SpinBox.setValue(info_dict['number_sweeps'])
-        self._pa.step_hf_DoubleSpinBox.setValue(info_dict['mw_step_hf'])
-        self._pa.threshold_DoubleSpinBox.setValue(info_dict['threshold'])
         self.change_fullb_params()
-        
-        self._pa.freq1_DoubleSpinBox.setValue(info_dict['freq1'])
-        self._pa.freq2_DoubleSpinBox.setValue(info_dict['freq2'])
         self.change_isob_params()
-
-        self.max_scanner = info_dict["max scanner"]
-
-        self._pa.file_tag_lineEdit.setText(info_dict["save tag"])
-        
-        self._sc.pl_cb_ComboBox.setCurrentText(info_dict["cmap pl"])
-        self._sc.topo_cb_ComboBox.setCurrentText(info_dict["cmap topo"])
         
         self.log.info("Recalled settings")
         return info_dict
@@ -19,12 +19,16 @@ Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
 top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
 """
 
+import math
 import numpy as np
 import time
 
 from core.module import Base, ConfigOption
 from interface.confocal_scanner_interface import ConfocalScannerInterface
 
+# The dummy scanner is always 2D cartesian
+_SCANNER_AXES = ('x', 'y')
+
 
 class NVMagnetometerDummy(Base, ConfocalScannerInterface):
     """ Dummy NV scanner. Produces a picture with several gaussian spots.
@@ -51,43 +55,44 @@ class NVMagnetometerDummy(Base, ConfocalScannerInterface):
         self._voltage_range = [-10, 10]
 
         self._position_range = [[0, 30e-6], [0, 30e-6]]
-        self._current_position = [0, 0][0:len(self.get_scanner_axes())]
+        self._current_position = [0, 0]
         self._num_points = 500
 
     def on_activate(self):
         """ Initialisation performed during activation of the module.
         """
+        # one generator for all the dummy data, numpy < 1.17 has no default_rng
+        if hasattr(np.random, 'default_rng'):
+            self._rng = np.random.default_rng()
+        else:
+            self._rng = np.random.RandomState()
+        self._counter_buffer = np.empty(0)
+
         # put randomly distributed NVs in the scanner, first the x,y scan
-        self._points = np.empty([self._num_points, 7])
-        # amplitude
-        self._points[:, 0] = np.random.normal(
+        # each gaussian parameter of the NVs is stored in its own array
+        self._nv_amplitude = self._rng.normal(
             4e5,
             1e5,
             self._num_points)
-        # x_zero
-        self._points[:, 1] = np.random.uniform(
+        self._nv_x_zero = self._rng.uniform(
             self._position_range[0][0],
             self._position_range[0][1],
             self._num_points)
-        # y_zero
-        self._points[:, 2] = np.random.uniform(
+        self._nv_y_zero = self._rng.uniform(
             self._position_range[1][0],
             self._position_range[1][1],
             self._num_points)
-        # sigma_x
-        self._points[:, 3] = np.random.normal(
+        self._nv_sigma_x = self._rng.normal(
             0.7e-6,
             0.1e-6,
             self._num_points)
-        # sigma_y
-        self._points[:, 4] = np.random.normal(
+        self._nv_sigma_y = self._rng.normal(
             0.7e-6,
             0.1e-6,
             self._num_points)
-        # theta
-        self._points[:, 5] = 10
-        # offset
-        self._points[:, 6] = 0
+        self._nv_theta = np.full(self._num_points, 10.)
+        self._nv_offset = np.zeros(self._num_points)
+        self._compute_gaussian_coefficients()
         #
         self._scanner_ao_channels = ["task"]
 
@@ -183,9 +188,9 @@ class NVMagnetometerDummy(Base, ConfocalScannerInterface):
         return 0
 
     def get_scanner_axes(self):
-        """ Dummy scanner is always 3D cartesian.
+        """ Dummy scanner is always 2D cartesian.
         """
-        return ['x', 'y']
+        return _SCANNER_AXES
 
     def get_scanner_count_channels(self):
         """ 3 counting channels in dummy confocal: normal, negative and a ramp."""
@@ -248,7 +253,8 @@ class NVMagnetometerDummy(Base, ConfocalScannerInterface):
 
         time.sleep(0.01)
 
-        self._current_position = [x, y][0:len(self.get_scanner_axes())]
+        self._current_position[0] = x
+        self._current_position[1] = y
         return 0
 
     def get_scanner_position(self):
@@ -256,7 +262,7 @@ class NVMagnetometerDummy(Base, ConfocalScannerInterface):
 
         @return float[]: current position in (x, y, z, a).
         """
-        return self._current_position[0:len(self.get_scanner_axes())]
+        return list(self._current_position)
 
     def _set_up_line(self, length=100):
         """ Sets up the analoque output for scanning a line.
@@ -286,26 +292,25 @@ class NVMagnetometerDummy(Base, ConfocalScannerInterface):
 
         if np.shape(line_path)[1] != self._line_length:
             self._set_up_line(np.shape(line_path)[1])
+        # the line takes as long as the real acquisition, including the computation
+        deadline = time.perf_counter() + self._line_length * 1. / self._clock_frequency
 
-        count_data = np.random.uniform(0, 2e4, self._line_length)
-        count_data_topo = np.random.uniform(0, 3, self._line_length)
+        count_data = self._rng.uniform(0, 2e4, self._line_length)
+        count_data_topo = self._rng.uniform(0, 3, self._line_length)
 
         #TODO: Change the gaussian function here to the one from fitlogic and delete the local modules to calculate
         #the gaussian functions
-        x_data = np.array(line_path[0, :])
-        y_data = np.array(line_path[1, :])
-        for i in range(self._num_points):
-            count_data += self.twoD_gaussian_function((x_data, y_data), *(self._points[i]))
+        x_data = line_path[0, :]
+        y_data = line_path[1, :]
+        count_data += self._nv_fluorescence(x_data, y_data)
 
-        time.sleep(self._line_length * 1. / self._clock_frequency)
-        time.sleep(self._line_length * 1. / self._clock_frequency)
+        self._wait_until(deadline)
 
         # update the scanner position instance variable
-        self._current_position = list(line_path[:, -1])
+        self._current_position[0] = line_path[0, -1]
+        self._current_position[1] = line_path[1, -1]
 
-        return np.array([
-                count_data,
-                count_data_topo]).transpose()
+        return np.stack((count_data, count_data_topo), axis=1)
     
     
     def get_counter(self, samples=None):
@@ -316,15 +321,35 @@ class NVMagnetometerDummy(Base, ConfocalScannerInterface):
                             readout frequency was defined in the counter setup.
                             That sets also the length of the readout array.
 
-        @return float [samples]: array with entries as photon counts per second
+        @return float [samples]: array with entries as photon counts per second.
+                                 The array is reused by the next call, copy it
+                                 to keep the data.
         """
-        data = np.full((2, samples), 222, dtype=np.float64)
-        rand = np.random.rand(2, samples)*2e4
-        data[:,:] = rand[:,:]
-        time.sleep(1/self._clock_frequency)
+        deadline = time.perf_counter() + 1/self._clock_frequency
+        # flat buffer so that the (2, samples) view stays contiguous
+        if self._counter_buffer.size < 2 * samples:
+            self._counter_buffer = np.empty(2 * samples)
+        data = self._counter_buffer[:2 * samples].reshape(2, samples)
+        if not isinstance(self._rng, np.random.RandomState):
+            # Generator fills the buffer in place
+            self._rng.random(out=data)
+            data *= 2e4
+        else:
+            data[:] = self._rng.uniform(0, 2e4, (2, samples))
+        self._wait_until(deadline)
         return data
         
     
+    def _wait_until(self, deadline):
+        """ Sleep until the given time.perf_counter() value, does not sleep at
+        all if the computation already took longer.
+
+        @param float deadline: time.perf_counter() value to wait for
+        """
+        remaining = deadline - time.perf_counter()
+        if remaining > 0:
+            time.sleep(remaining)
+
     def _write_scanner_ao(self, voltages=None, start=True):
         """Writes a set of voltages to the analog outputs.
         """
@@ -372,6 +397,57 @@ class NVMagnetometerDummy(Base, ConfocalScannerInterface):
 ############################################################################
 
 
+    def _compute_gaussian_coefficients(self):
+        """ Compute the gaussian coefficients of all the dummy NVs once, they
+        do not change during the scans. Each is stored as a (N, 1) column to
+        be broadcast against the points of a line.
+        """
+        theta = self._nv_theta
+        sigma_x = self._nv_sigma_x
+        sigma_y = self._nv_sigma_y
+        self._gauss_x_zero = self._nv_x_zero[:, np.newaxis]
+        self._gauss_y_zero = self._nv_y_zero[:, np.newaxis]
+        cos2 = np.cos(theta)**2
+        sin2 = 1 - cos2
+        sin2t = np.sin(2 * theta)
+        inv_2sx2 = 1 / (2 * sigma_x**2)
+        inv_2sy2 = 1 / (2 * sigma_y**2)
+        self._gauss_a = (cos2 * inv_2sx2 + sin2 * inv_2sy2)[:, np.newaxis]
+        self._gauss_b = (0.5 * sin2t * (inv_2sy2 - inv_2sx2))[:, np.newaxis]
+        self._gauss_c = (sin2 * inv_2sx2 + cos2 * inv_2sy2)[:, np.newaxis]
+        self._gauss_offset = np.sum(self._nv_offset)
+        self._gauss_buffers = None
+
+    def _nv_fluorescence(self, x, y):
+        """ Sum of the gaussian spots of all the dummy NVs, evaluated for all
+        the NVs at once on (N, len(x)) buffers reused between lines.
+
+        @param np.ndarray x: x values of the points
+        @param np.ndarray y: y values of the points
+
+        @return np.ndarray: summed fluorescence on each point
+        """
+        shape = (self._num_points, len(x))
+        if self._gauss_buffers is None or self._gauss_buffers[0].shape != shape:
+            self._gauss_buffers = (np.empty(shape), np.empty(shape), np.empty(shape))
+        arg, dx, dy = self._gauss_buffers
+
+        np.subtract(x, self._gauss_x_zero, out=dx)
+        np.subtract(y, self._gauss_y_zero, out=dy)
+        # arg = a*dx**2 + 2*b*dx*dy + c*dy**2
+        np.multiply(dx, dx, out=arg)
+        arg *= self._gauss_a
+        dx *= dy
+        dx *= 2 * self._gauss_b
+        arg += dx
+        dy *= dy
+        dy *= self._gauss_c
+        arg += dy
+        np.negative(arg, out=arg)
+        np.exp(arg, out=arg)
+        # weighting by the amplitudes and summing over the NVs in one product
+        return np.dot(self._nv_amplitude, arg) + self._gauss_offset
+
     def twoD_gaussian_function(self, x_data_tuple=None, amplitude=None,
                                x_zero=None, y_zero=None, sigma_x=None,
                                sigma_y=None, theta=None, offset=None):
@@ -392,23 +468,20 @@ class NVMagnetometerDummy(Base, ConfocalScannerInterface):
         @return callable function: returns the function
 
         """
-        # check if parameters make sense
-        #FIXME: Check for 2D matrix
-        if not isinstance( x_data_tuple,(frozenset, list, set, tuple, np.ndarray)):
-            self.log.error('Given range of axes is no array type.')
-
-        parameters = [amplitude, x_zero, y_zero, sigma_x, sigma_y, theta, offset]
-        for var in parameters:
-            if not isinstance(var, (float, int)):
-                self.log.error('Given range of parameter is no float or int.')
-
+        # no type checks here, invalid parameters fail in the conversions and
+        # the arithmetic below
         (x, y) = x_data_tuple
         x_zero = float(x_zero)
         y_zero = float(y_zero)
 
-        a = (np.cos(theta)**2) / (2 * sigma_x**2) + (np.sin(theta)**2) / (2 * sigma_y**2)
-        b = -(np.sin(2 * theta)) / (4 * sigma_x**2) + (np.sin(2 * theta)) / (4 * sigma_y**2)
-        c = (np.sin(theta)**2) / (2 * sigma_x**2) + (np.cos(theta)**2) / (2 * sigma_y**2)
+        # scalar parameters, math avoids the numpy ufunc overhead
+        cos2 = math.cos(theta)**2
+        sin2 = 1 - cos2
+        inv_2sx2 = 1 / (2 * sigma_x**2)
+        inv_2sy2 = 1 / (2 * sigma_y**2)
+        a = cos2 * inv_2sx2 + sin2 * inv_2sy2
+        b = 0.5 * math.sin(2 * theta) * (inv_2sy2 - inv_2sx2)
+        c = sin2 * inv_2sx2 + cos2 * inv_2sy2
         g = offset + amplitude * np.exp(
             - (a * ((x - x_zero)**2)
                 + 2 * b * (x - x_zero) * (y - y_zero)
@@ -24,8 +24,12 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 import visa
 
 from core.module import Base, ConfigOption
+from core.util.visa_manager import get_resource_manager
 from interface.cryo_levelmeter_interface import CryoLevelMeterInterface
-import time
+
+# commands for the legal channel and mode values, built once
+_CHAN_CMD = {1: "CHAN 1", 2: "CHAN 2"}
+_MODE_CMD = {"S": "MODE S", "C": "MODE C", "0": "MODE 0"}
 
 class LevelMeter(Base, CryoLevelMeterInterface):
     
@@ -39,14 +43,16 @@ class LevelMeter(Base, CryoLevelMeterInterface):
     def on_activate(self):
         """ Startup the module. """
 
-        rm = visa.ResourceManager()
+        rm = get_resource_manager()
         try:
             self._inst = rm.open_resource(self._address)
         except visa.VisaIOError:
             self.log.error("Could not connect to hardware. Please check the wires and the address.")
 
         self._model = self.query('*IDN?')[:-1] 
-        self._mode = "OFF"
+        # channel and mode as last read or set, None if unknown
+        self._channel = None
+        self._mode = None
         self.log.info('Connected to {}'.format(self._model))
 
 
@@ -55,22 +61,18 @@ class LevelMeter(Base, CryoLevelMeterInterface):
         self._inst.close()
 
     def query(self, msg):
-        """ Specific query function because the hardware sends the command back before answering."""
+        """ Specific query function because the hardware sends the command back before answering.
+        Each read blocks until the end of its message, no need to wait in between."""
         self._inst.write(msg)
-        time.sleep(0.2)
         self._inst.read()
-        time.sleep(0.2)
         rep = self._inst.read()
-        time.sleep(0.2)
         self._inst.read()
         return rep 
     
     def write(self, msg):
         """ Specific query function because the hardware sends the command back."""
         self._inst.write(msg)
-        time.sleep(0.2)
         self._inst.read()
-        time.sleep(0.2)
         self._inst.read()
         return
         
@@ -78,11 +80,13 @@ class LevelMeter(Base, CryoLevelMeterInterface):
         
     def getChannel(self):
         """
-        Read the channel number. 
+        Read the channel number, the instrument is only queried if the
+        channel is not known.
         @return int channel number.
         """
-        ch = int(self.query("CHAN?")) 
-        return ch
+        if self._channel is None:
+            self._channel = int(self.query("CHAN?"))
+        return self._channel
 
 
     def setChannel(self, ch):
@@ -90,34 +94,45 @@ class LevelMeter(Base, CryoLevelMeterInterface):
         Select the channel to use.
         @param int channel number.
         """
-        if not ch in (1, 2):
+        if not ch in _CHAN_CMD:
             self.log.warning("Wrong channel number!")
             return
         else:
-            rep = self.write(f"CHAN {ch}")
+            rep = self.write(_CHAN_CMD[ch])
+            self._channel = ch
             return
 
         
     def setRemote(self):
         """ Switch to remote mode. """
         rep = self.write("REMOTE")
+        self._forget_settings()
         return
 
 
     def setLocal(self):
         """ Switch to local mode. """
         rep = self.write("LOCAL")
+        self._forget_settings()
         return
 
 
+    def _forget_settings(self):
+        """ The settings can be changed on the front panel in local mode, they
+        are read again from the instrument at the next request. """
+        self._channel = None
+        self._mode = None
+
+
     def getMeasurementMode(self):
         """ 
-        Read measurement mode.
+        Read measurement mode, the instrument is only queried if the mode is
+        not known.
         @return string "Continuous" or "Sample/Hold" or "OFF"
         """
-        mode = self.query("MODE?") # MIGHT NEED TO FORMAT BETTER
-        self._mode = mode
-        return mode
+        if self._mode is None:
+            self._mode = self.query("MODE?").strip()
+        return self._mode
 
     
     def setMeasurementMode(self, mode):
@@ -125,11 +140,12 @@ class LevelMeter(Base, CryoLevelMeterInterface):
         Set measurement mode.
         @param string "C" for continuous or "S" for sample/hold or "0" for off.
         """
-        if not mode in ("S", "C", "0"):
+        if not mode in _MODE_CMD:
             self.log.warning("Wrong selected mode!")
             return
         else:
-            rep = self.write(f"MODE {mode}")
+            rep = self.write(_MODE_CMD[mode])
+            self._mode = None
             self.getMeasurementMode()
             return
 
@@ -140,7 +156,7 @@ class LevelMeter(Base, CryoLevelMeterInterface):
         @return float measured value
         @return string unit
         """
-        if self._mode is not "Continuous":
+        if self._mode != "Continuous":
             self.write("MEAS")
         rep = self.query("MEAS?")
         #print("query line", rep)
@@ -24,8 +24,7 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 
 from core.module import Base, ConfigOption
 from interface.cryo_levelmeter_interface import CryoLevelMeterInterface
-import datetime
-import numpy as np
+import time
 
 class LevelMeterDummy(Base, CryoLevelMeterInterface):
     
@@ -44,7 +43,7 @@ class LevelMeterDummy(Base, CryoLevelMeterInterface):
         self.ch = 1
         self.op_mode = "remote"
         self.last_val = 100
-        self.last_time = datetime.datetime.now()
+        self.last_time = time.monotonic()
 
     def on_deactivate(self):
         """ Stops the module. """
@@ -117,9 +116,8 @@ class LevelMeterDummy(Base, CryoLevelMeterInterface):
         @return float measured value
         @return string unit
         """
-        now = datetime.datetime.now()
-        interval = now - self.last_time
-        val = np.max(self.last_val - interval.total_seconds()*1e-2/3600, 0)
+        now = time.monotonic()
+        val = max(self.last_val - (now - self.last_time)*1e-2/3600, 0.0)
         unit = "%"
         self.last_time = now
         self.last_val = val
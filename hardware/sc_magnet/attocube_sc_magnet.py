@@ -19,13 +19,19 @@ Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
 top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
 """
 
-import pyvisa
+import re
 import time
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 
 from core.module import Base, ConfigOption
+from core.util.mutex import RecursiveMutex
+from core.util.visa_manager import get_resource_manager
 from interface.sc_magnet_interface import SuperConductingMagnetInterface
 
+# number at the start of an answer, before its unit
+_NUMBER = re.compile(r'[-+]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][-+]?[0-9]+)?')
+
 class SuperConductingMagnet(Base, SuperConductingMagnetInterface):
     """ Magnet positioning software for attocube's superconducting magnet.
 
@@ -42,6 +48,9 @@ class SuperConductingMagnet(Base, SuperConductingMagnetInterface):
         gpib_address_y: 'GPIB0::12::INSTR'
         gpib_address_z: 'GPIB0::12::INSTR'
         gpib_timeout: 10
+        sequential_io: True
+        query_delay: 0 # in s
+        cache_settings: True
         max_field_z: 5000
         max_field_x: 5000
         max_field_y: 5000
@@ -69,64 +78,112 @@ class SuperConductingMagnet(Base, SuperConductingMagnetInterface):
     _waitingtime = ConfigOption('magnet_waitingtime', 0.5)
     
     _max_power = ConfigOption('max_power', None)
+
+    # send the queries one by one. Set it to False to send them in a single
+    # concatenated message, only once the power supply was checked to answer
+    # it on one line separated by semicolons
+    _sequential_io = ConfigOption('sequential_io', True)
+    # waiting time between a query and the reading of its answer, in s. The
+    # reads block until the answer arrives, only needed for slow devices.
+    _query_delay = ConfigOption('query_delay', 0)
+    # keep the units, mode, limits, ranges and rates read from the power
+    # supply until they are set again instead of querying them each time
+    _cache_settings = ConfigOption('cache_settings', True)
+
+    # queries of get_active_coil_status for each mode and the attributes
+    # storing their answers
+    _status_queries = {1: ('IOUT?', 'VOUT?'),
+                       2: ('VMAG?', 'IMAG?'),
+                       3: ('PSHTR?',),
+                       4: ('IOUT?', 'VOUT?', 'VMAG?', 'IMAG?', 'PSHTR?')}
+    _status_attributes = {'IOUT?': 'iout', 'VOUT?': 'vout', 'VMAG?': 'vmag',
+                          'IMAG?': 'imag', 'PSHTR?': 'pshtr'}
     
     def on_activate(self):
         """ Initialisation performed during activation of the module. """
+        # settings read from the power supplies, see _cached
+        self._cache = {}
+        self.current_channel = None
+
         # trying to load the visa connection to the module
-        self._rm = pyvisa.ResourceManager()
-        try:
-            test = 'Could not connect to the address >>{}<<.'.format(self._address_xy)
-            self.xy_magnet = self._rm.open_resource(self._address_xy,
-                                                          timeout=self._timeout)
-            test = 'Could not connect to the address >>{}<<.'.format(self._address_z)
-            self.z_magnet = self._rm.open_resource(self._address_z,
-                                                          timeout=self._timeout)
-        except:
-            self.log.error(test)
-            raise
+        self._rm = get_resource_manager()
+        # the power supplies are opened in parallel
+        addresses = {'xy_magnet': self._address_xy, 'z_magnet': self._address_z}
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            opening = {name: executor.submit(self._rm.open_resource, address,
+                                             timeout=self._timeout)
+                       for name, address in addresses.items()}
+        for name, future in opening.items():
+            try:
+                setattr(self, name, future.result())
+            except:
+                self.log.error('Could not connect to the address >>%s<<.', addresses[name])
+                raise
+        # serializes the transactions on each power supply
+        self._locks = {id(self.xy_magnet): RecursiveMutex(),
+                       id(self.z_magnet): RecursiveMutex()}
 
         self._model = self.query_device(self.xy_magnet, '*IDN?\n')
-        self.log.info('Superconducting magnet {} initialised and connected.'.format(self._model))
-        self.xy_magnet.write('*CLS;*RST\n')
-        self.xy_magnet.read()
+        self.log.info('Superconducting magnet %s initialised and connected.', self._model)
+        self._write_device(self.xy_magnet, '*CLS;*RST\n')
         
         self._model = self.query_device(self.z_magnet,'*IDN?\n')
-        self.log.info('Superconducting magnet {} initialised and connected.'.format(self._model))
-        self.z_magnet.write('*CLS;*RST\n')
-        self.z_magnet.read()
+        self.log.info('Superconducting magnet %s initialised and connected.', self._model)
+        self._write_device(self.z_magnet, '*CLS;*RST\n')
         return
     
     def on_deactivate(self):
         """ Cleanup performed during deactivation of the module. """
-        temp = 0
-        self.channel_select(self.xy_magnet, 2)
-        temp += self.query_device(self.xy_magnet, 'PSHTR?\n')
-        self.channel_select(self.xy_magnet, 1)
-        temp += self.query_device(self.xy_magnet, 'PSHTR?\n')
-        temp += self.query_device(self.z_magnet, 'PSHTR?\n')
-        if temp > 0:
+        # the power supplies are independent, they are checked in parallel
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            checks = [executor.submit(self._check_coils, self.xy_magnet, [2, 1]),
+                      executor.submit(self._check_coils, self.z_magnet, [None])]
+            status = [coil for check in checks for coil in check.result()]
+
+        if any(pshtr > 0 for pshtr, imag, iout in status):
             self.log.warning('Switch heater still ON !')
-            
-        temp = 0
-        self.channel_select(self.xy_magnet, 2)
-        temp += self.query_device(self.xy_magnet, 'IMAG?\n')
-        self.channel_select(self.xy_magnet, 1)
-        temp += self.query_device(self.xy_magnet, 'IMAG?\n')
-        temp += self.query_device(self.z_magnet, 'IMAG?\n')
-        if temp != 0:
+        if any(imag != 0 for pshtr, imag, iout in status):
             self.log.warning('Magnetic field still applied !')
-            
-        temp = 0
-        self.channel_select(self.xy_magnet, 2)
-        temp += self.query_device(self.xy_magnet, 'IOUT?\n')
-        self.channel_select(self.xy_magnet, 1)
-        temp += self.query_device(self.xy_magnet, 'IOUT?\n')
-        temp += self.query_device(self.z_magnet, 'IOUT?\n')
-        if temp != 0:
+        if any(iout != 0 for pshtr, imag, iout in status):
             self.log.warning('Power supply output current not at zero !')
         
-        self._rm.close()
+        # the resource manager is shared with the other modules
+        self.xy_magnet.close()
+        self.z_magnet.close()
         return
+
+    def _check_coils(self, axis, channels):
+        """
+        Read the switch heater state, the magnet current and the output
+        current of the coils driven by one power supply.
+        @param axis: address of the power supply
+        @param list channels: channels to read, [None] for a single channel
+
+        @return list of tuple: (pshtr, imag, iout) for each channel
+        """
+        status = []
+        for channel in channels:
+            # keep the channel selected until it is read
+            with self._locks[id(axis)]:
+                if channel is not None:
+                    self.channel_select(axis, channel)
+                answers = self._query_many(axis, ['PSHTR?', 'IMAG?', 'IOUT?'])
+            status.append(tuple(self._parse_reading(answer) for answer in answers))
+        return status
+
+    def _parse_reading(self, answer):
+        """
+        Read the number at the start of an answer, whatever its unit.
+        @param str answer: answer of the power supply, e.g. '1.234kG'
+
+        @return float: the value, inf if it can't be read, so that the coil
+                       is not reported at zero
+        """
+        match = _NUMBER.match(answer.strip())
+        if match is None:
+            self.log.error('Could not read the value of the answer {!r}.'.format(answer))
+            return np.inf
+        return float(match.group())
     
     def get_limits(self, axis):
         """
@@ -135,9 +192,8 @@ class SuperConductingMagnet(Base, SuperConductingMagnetInterface):
         
         @return str [llim, ulim, vlim]
         """
-        self.ll = self.query_device(axis, 'LLIM?\n')[:-2]
-        self.ul = self.query_device(axis, 'ULIM?\n')[:-2]
-        self.vl = self.query_device(axis, 'VLIM?\n')[:-2]
+        self.ll, self.ul, self.vl = self._cached(
+            axis, 'LIM?', lambda: self._query_many(axis, ['LLIM?', 'ULIM?', 'VLIM?']))
         
         return [self.ll, self.ul, self.vl]
     
@@ -145,8 +201,7 @@ class SuperConductingMagnet(Base, SuperConductingMagnetInterface):
         """
         Select remote operation
         """
-        axis.write('*CLS;REMOTE;ERROR 0\n')
-        axis.read()
+        self._write_device(axis, '*CLS;REMOTE;ERROR 0\n')
 
         return
     
@@ -154,8 +209,11 @@ class SuperConductingMagnet(Base, SuperConductingMagnetInterface):
         """
         Select local operation
         """
-        axis.write('*CLS;LOCAL;ERROR 0\n')
-        axis.read()
+        self._write_device(axis, '*CLS;LOCAL;ERROR 0\n')
+        # the settings and the channel can now be changed on the front panel
+        self._forget_settings(axis)
+        if axis is self.xy_magnet:
+            self.current_channel = None
 
         return
     
@@ -166,9 +224,11 @@ class SuperConductingMagnet(Base, SuperConductingMagnetInterface):
         
         @return int: selected channel
         """
-        axis.write('CHAN {}\n'.format(n_channel))
-        axis.read()
-        self.current_channel = n_channel
+        with self._locks[id(axis)]:
+            if n_channel == self._channel_of(axis):
+                return n_channel
+            self._write_device(axis, 'CHAN {}\n'.format(n_channel))
+            self.current_channel = n_channel
         
         return n_channel
     
@@ -178,14 +238,12 @@ class SuperConductingMagnet(Base, SuperConductingMagnetInterface):
         
         @return array
         """
-        if mode == 1 or mode == 4:
-            self.iout = self.query_device(axis, 'IOUT?\n')[:-2]
-            self.vout = self.query_device(axis,'VOUT?\n')[:-2]
-        if mode == 2 or mode == 4:
-            self.vmag = self.query_device(axis, 'VMAG?\n')[:-2]
-            self.imag = self.query_device(axis, 'IMAG?\n')[:-2]
-        if mode == 3 or mode == 4:
-            self.pshtr = self.query_device(axis,'PSHTR?\n')
+        commands = self._status_queries.get(mode, ())
+        if commands:
+            answers = self._query_many(axis, commands)
+            for cmd, answer in zip(commands, answers):
+                setattr(self, self._status_attributes[cmd], answer)
+        if 'PSHTR?' in commands:
             if int(self.pshtr) == 0:
                 self.pshtr = 'OFF'
             else:
@@ -199,9 +257,8 @@ class SuperConductingMagnet(Base, SuperConductingMagnetInterface):
         
         @return array
         """
-        self.current_rates = []
-        for i in range(6):
-            self.current_rates.append(self.query_device(axis, 'RATE? {}\n'.format(i))[:-2])
+        self.current_rates = list(self._cached(
+            axis, 'RATE?', lambda: self._query_many(axis, ['RATE? {}'.format(i) for i in range(6)])))
             
         return self.current_rates
     
@@ -221,9 +278,8 @@ class SuperConductingMagnet(Base, SuperConductingMagnetInterface):
         
         @return str
         """
-        self.current_ranges = []
-        for i in range(5):
-            self.current_ranges.append(self.query_device(axis,'RANGE? {}\n'.format(i))[:-2])
+        self.current_ranges = list(self._cached(
+            axis, 'RANGE?', lambda: self._query_many(axis, ['RANGE? {}'.format(i) for i in range(5)])))
             
         return self.current_ranges
     
@@ -233,7 +289,8 @@ class SuperConductingMagnet(Base, SuperConductingMagnetInterface):
         
         @return str
         """
-        self.current_mode = self.query_device(axis, 'MODE?\n')
+        self.current_mode = self._cached(axis, 'MODE?',
+                                         lambda: self.query_device(axis, 'MODE?\n'))
         
         return self.current_mode
     
@@ -243,7 +300,8 @@ class SuperConductingMagnet(Base, SuperConductingMagnetInterface):
         
         @return str
         """
-        self.units = self.query_device(axis, 'UNITS?\n')
+        self.units = self._cached(axis, 'UNITS?',
+                                  lambda: self.query_device(axis, 'UNITS?\n'))
         
         return self.units
     
@@ -253,8 +311,7 @@ class SuperConductingMagnet(Base, SuperConductingMagnetInterface):
         @param USB adress
         @param string: ON or OFF to set the switch heater on or off
         """
-        axis.write('PSHTR {}\n'.format(mode))
-        axis.read()
+        self._write_device(axis, 'PSHTR {}\n'.format(mode))
         self.sh_mode = mode
         
         return mode
@@ -266,8 +323,9 @@ class SuperConductingMagnet(Base, SuperConductingMagnetInterface):
         
         @return string: selected units
         """
-        axis.write('UNITS {}\n'.format(units))
-        axis.read()
+        self._write_device(axis, 'UNITS {}\n'.format(units))
+        # the limits are given in the selected units
+        self._forget_settings(axis, 'UNITS?', 'LIM?')
         self.current_units = units
         
         return units
@@ -279,80 +337,71 @@ class SuperConductingMagnet(Base, SuperConductingMagnetInterface):
         
         @return str
         """
-        axis.write('SWEEP ' + mode + '\n')
-        axis.read()
+        self._write_device(axis, 'SWEEP ' + mode + '\n')
         self.sweep_mode = mode
         
         return mode
     
-    def set_limits(self, axis, ll=None, ul=None, vl=None):
+    def set_limits(self, axis, ll=None, ul=None, vl=None, verify=False):
         """
         Set current and voltage sweep limits
         @param float: lower current sweep limit
         @param float: upper current sweep limit
         @param float: voltage sweep limit
+        @param bool verify: wait for the power supply to complete the command,
+                            only needed for tests and debugging
         
         @return array
         """
-        order = ''
-        if ll is not None:
-            order += 'LLIM {};'.format(ll)
-        if ul is not None:
-            order += 'ULIM {};'.format(ul)
-        if vl is not None:
-            order += 'VLIM {};'.format(vl)
-        order = order[:-1]
-        order += '\n'
-        
-        axis.write(order)
-        axis.read()
+        order = ';'.join('{} {}'.format(cmd, value)
+                         for cmd, value in (('LLIM', ll), ('ULIM', ul), ('VLIM', vl))
+                         if value is not None) + '\n'
+        
+        self._write_device(axis, order, verify)
+        self._forget_settings(axis, 'LIM?')
         [self.ll, self.ul, self.vl] = [ll, ul, vl]
         
         return [ll, ul, vl]
     
-    def set_ranges(self, axis, ranges):
+    def set_ranges(self, axis, ranges, verify=False):
         """
         Set range limit for sweep rate boundary
         @param array: range values
+        @param bool verify: wait for the power supply to complete the command,
+                            only needed for tests and debugging
         
         @return array
         """
         if len(ranges) != 5:
-            self.log.warning('Not enough ranges ({} instead of 5)'.format(len(ranges)))
+            self.log.warning('Not enough ranges (%d instead of 5)', len(ranges))
             return
         
-        order = ''
         self.current_ranges = ranges
-        for i in range(5):
-            order += 'RANGE {} {};'.format(i, ranges[i])
-        order = order[:-1]
-        order += '\n'
+        order = ';'.join('RANGE {} {}'.format(i, r) for i, r in enumerate(ranges)) + '\n'
         
-        axis.write(order)
-        axis.read()
+        self._write_device(axis, order, verify)
+        self._forget_settings(axis, 'RANGE?')
         
         return ranges
     
-    def set_rates(self, axis, rates):
+    def set_rates(self, axis, rates, verify=False):
         """
         Set sweep rates for selected sweep range
         @param array: range values
+        @param bool verify: wait for the power supply to complete the command,
+                            only needed for tests and debugging
         
         @return array
         """
         if len(rates) != 6:
-            self.log.warning('not enough rates ({} instead of 6)'.format(len(rates)))
+            self.log.warning('not enough rates (%d instead of 6)', len(rates))
             return
         
-        order = ''
         self.current_rates = rates
-        for i in range(6):
-            order += 'RATE {} {};'.format(i, rates[i])
-        order = order[:-1]
-        order += '\n'
+        order = ';'.join('RATE {} {}'.format(i, r) for i, r in enumerate(rates)) + '\n'
         
-        axis.write(order)
-        axis.read()
+        self._write_device(axis, order, verify)
+        self._forget_settings(axis, 'RATE?')
         
         return rates
     
@@ -366,13 +415,87 @@ class SuperConductingMagnet(Base, SuperConductingMagnetInterface):
         
         return temp
     
-    def query_device(self, axis, message, discarded_line_nb=1):
+    def query_device(self, axis, message):
+        """
+        query from rm does not work for us, the power supply sends the command
+        back before answering. The echo is skipped and the answer returned
+        with its line end, the callers strip it.
+        The power supply only answers in ASCII, the values are followed by
+        their unit (e.g. '1.234kG'), which the logic relies on.
+        The reads block until a line is received or the timeout expires.
+        """
+        with self._locks[id(axis)]:
+            axis.write(message)
+            if self._query_delay > 0:
+                time.sleep(self._query_delay)
+            axis.read()
+            answer = axis.read()
+        return answer
+
+    def _write_device(self, axis, message, verify=False):
         """
-        query from rm does not work for us, we need to read several lines.
+        Send a command and read back its echo.
+        @param bool verify: wait for the command to be completed with *OPC?
         """
-        axis.write(message)
-        time.sleep(self._timeout*1e-3)
-        for i in range(discarded_line_nb):
+        with self._locks[id(axis)]:
+            axis.write(message)
             axis.read()
-        answer = axis.read()
-        return answer
+            if verify:
+                self.query_device(axis, '*OPC?\n')
+
+    def _query_many(self, axis, commands):
+        """
+        Query several values in a single message, the answers are separated
+        by semicolons. The queries are sent one by one if sequential_io is set.
+        @param list commands: queries, without the line end
+
+        @return list of str: answers, without the line end
+        """
+        if not self._sequential_io:
+            with self._locks[id(axis)]:
+                answers = self.query_device(axis, ';'.join(commands) + '\n').rstrip().split(';')
+                if len(answers) == len(commands):
+                    return answers
+                # the other answers may be waiting in the buffer
+                axis.clear()
+            self.log.warning('Got {} answers to the {} queries {}, sending the queries one '
+                             'by one from now on.'.format(len(answers), len(commands), commands))
+            self._sequential_io = True
+        return [self.query_device(axis, cmd + '\n').rstrip() for cmd in commands]
+
+    def _channel_of(self, axis):
+        """ Channel addressed on the power supply, only the xy one has two. """
+        return self.current_channel if axis is self.xy_magnet else None
+
+    def _cached(self, axis, key, read):
+        """
+        Return a setting of the selected coil, read from the power supply
+        only if it is not known yet.
+        @param axis: address of the power supply
+        @param str key: name of the setting
+        @param function read: reads the setting from the power supply
+
+        @return: the setting
+        """
+        if not self._cache_settings:
+            return read()
+        key = (id(axis), self._channel_of(axis), key)
+        if key not in self._cache:
+            self._cache[key] = read()
+        return self._cache[key]
+
+    def _forget_settings(self, axis, *keys):
+        """
+        Forget settings of the selected coil, they are read again at the next
+        request. Without keys, the settings of all the coils of the power
+        supply are forgotten.
+        @param axis: address of the power supply
+        @param str keys: names of the settings
+        """
+        if not keys:
+            for key in [key for key in self._cache if key[0] == id(axis)]:
+                del self._cache[key]
+            return
+        channel = self._channel_of(axis)
+        for key in keys:
+            self._cache.pop((id(axis), channel, key), None)
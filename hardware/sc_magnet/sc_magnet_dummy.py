@@ -316,7 +316,7 @@ class SuperConductingMagnetDummy(Base, SuperConductingMagnetInterface):
         @return array
         """
         if len(ranges) != 5:
-            self.log.warning('Not enough ranges ({} instead of 5)'.format(len(ranges)))
+            self.log.warning('Not enough ranges (%d instead of 5)', len(ranges))
             return
         
         if "x" in axis.keys(): 
@@ -334,7 +334,7 @@ class SuperConductingMagnetDummy(Base, SuperConductingMagnetInterface):
         @return array
         """
         if len(rates) != 6:
-            self.log.warning('not enough rates ({} instead of 6)'.format(len(rates)))
+            self.log.warning('not enough rates (%d instead of 6)', len(rates))
             return
         
         if "x" in axis.keys(): 
@@ -24,6 +24,7 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 import visa
 
 from core.module import Base, ConfigOption
+from core.util.visa_manager import get_resource_manager
 from interface.temp_controller_interface import TempControllerInterface
 
 class TempController(Base, TempControllerInterface):
@@ -38,7 +39,7 @@ class TempController(Base, TempControllerInterface):
     def on_activate(self):
         """ Startup the module. """
 
-        rm = visa.ResourceManager()
+        rm = get_resource_manager()
         try:
             self._inst = rm.open_resource(self._address, baud_rate=57600, data_bits=7,
                                           parity=visa.constants.Parity.odd,
@@ -50,6 +51,7 @@ class TempController(Base, TempControllerInterface):
         self.log.info('Connected to {}.'.format(self._model))
         self.channel = "a" # default value
         self.unit = "K" # default value
+        self._update_cmd()
 
 
     def on_deactivate(self):
@@ -72,18 +74,19 @@ class TempController(Base, TempControllerInterface):
         @param string channel name.
         """
         self.channel = ch.lower()
+        self._update_cmd()
         return
 
         
     def setRemote(self):
         """ Switch to remote mode. """
-        rep = self._inst.query("MODE 1")
+        self._inst.write("MODE 1")
         return
 
 
     def setLocal(self):
         """ Switch to local mode. """
-        rep = self._inst.query("MODE 0")
+        self._inst.write("MODE 0")
         return
 
     def setUnit(self, unit):
@@ -91,19 +94,43 @@ class TempController(Base, TempControllerInterface):
         @params string unit "C" or "K"
         """
         self.unit = unit
+        self._update_cmd()
         return
 
+    def _update_cmd(self):
+        """ Prepare the temperature query for the selected channel and unit,
+        None if the unit is unknown. """
+        cmd = {"K": "KRDG?", "C": "CRDG?"}.get(self.unit)
+        self._temp_cmd = None if cmd is None else f"{cmd} {self.channel}"
+        # both queries in one message, the answer is "A;B"
+        self._temp_all_cmd = None if cmd is None else f"{cmd} A;{cmd} B"
+
     def getTemp(self):
         """ 
         Measure the temperature
         @return float measured value
         @return string unit
         """
-        if self.unit == "K":
-            val = float(self._inst.query(f"KRDG? {self.channel}"))
-        elif self.unit == "C":
-            val = float(self._inst.query(f"CRDG? {self.channel}"))
-        else:
+        if self._temp_cmd is None:
+            self.log.error("Unknown temperature unit!")
+            return
+        return float(self._inst.query(self._temp_cmd)), self.unit
+
+    def getTempAll(self):
+        """ 
+        Measure the temperature of both channels in one query
+        @return float measured value of channel A
+        @return float measured value of channel B
+        @return string unit
+        """
+        if self._temp_all_cmd is None:
             self.log.error("Unknown temperature unit!")
             return
-        return val, self.unit
+        answer = self._inst.query(self._temp_all_cmd)
+        try:
+            valA, valB = answer.split(";")
+            return float(valA), float(valB), self.unit
+        except ValueError:
+            self.log.warning("Unexpected answer {!r} to {}, reading the channels one "
+                             "by one.".format(answer, self._temp_all_cmd))
+            return super().getTempAll()
@@ -39,12 +39,19 @@ class TempControllerDummy(Base, TempControllerInterface):
         self._model = "Dummy instrument"
         self.log.info('Connected to {}.'.format(self._model))
         self.channel = "a" # default value
+        self._ch = 0 # index of the channel in the state arrays
         self.unit = "K" # default value
         self.mode = "remote"
-        self.trenda = 1
-        self.tempa = 295
-        self.trendb = 1
-        self.tempb = 290 
+        # temperature and direction of its drift for channels a and b
+        self.temps = np.array([295., 290.])
+        self.trends = np.array([1., 1.])
+        # random numbers are drawn by blocks, numpy < 1.17 has no default_rng
+        if hasattr(np.random, 'default_rng'):
+            self._rng = np.random.default_rng()
+        else:
+            self._rng = np.random.RandomState()
+        self._rand_buf = []
+        self._rand_idx = 0
 
 
     def on_deactivate(self):
@@ -67,6 +74,7 @@ class TempControllerDummy(Base, TempControllerInterface):
         @param string channel name.
         """
         self.channel = ch.lower()
+        self._ch = 0 if self.channel == "a" else 1
         return
 
         
@@ -94,21 +102,36 @@ class TempControllerDummy(Base, TempControllerInterface):
         @return float measured value
         @return string unit
         """
-        test_trend = np.random.rand()
+        return self._measure(self._ch), self.unit
+
+    def getTempAll(self):
+        """ 
+        Measure the temperature of both channels
+        @return float measured value of channel A
+        @return float measured value of channel B
+        @return string unit
+        """
+        return self._measure(0), self._measure(1), self.unit
+
+    def _measure(self, idx):
+        """ Let the temperature of the channel of index idx drift and return it. """
+        test_trend, var = self._random_pair()
         if test_trend < 0.1:
-            if self.channel == "a":
-                self.trenda = - self.trenda
-            else:
-                self.trendb = - self.trendb
-        var = 0.1*np.random.rand() # max variation 100 mK between 2 points
-        if self.channel == "a":
-            val = self.tempa + self.trenda*var
-            self.tempa = val
-        else:
-            val = self.tempb + self.trendb*var
-            self.tempb = val
+            self.trends[idx] = - self.trends[idx]
+        var = 0.1*var # max variation 100 mK between 2 points
+        self.temps[idx] += self.trends[idx]*var
+        val = float(self.temps[idx])
             
         if self.unit == "C":
             val = val - 273.15
 
-        return val, self.unit
+        return val
+
+    def _random_pair(self):
+        """ Return two random numbers in [0, 1) from the pre-drawn block. """
+        if self._rand_idx + 2 > len(self._rand_buf):
+            self._rand_buf = self._rng.uniform(size=1024).tolist()
+            self._rand_idx = 0
+        i = self._rand_idx
+        self._rand_idx = i + 2
+        return self._rand_buf[i], self._rand_buf[i + 1]
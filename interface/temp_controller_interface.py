@@ -81,6 +81,23 @@ class TempControllerInterface(metaclass=InterfaceMetaclass):
         """
         pass
 
+    def getTempAll(self):
+        """ 
+        Measure the temperature of both channels, without changing the
+        selected channel. This default reads the channels one after the
+        other, the hardware modules can override it with a single query.
+        @return float measured value of channel A
+        @return float measured value of channel B
+        @return string unit
+        """
+        channel = self.getChannel()
+        self.setChannel("A")
+        valA, unit = self.getTemp()
+        self.setChannel("B")
+        valB, unit = self.getTemp()
+        self.setChannel(channel)
+        return valA, valB, unit
+
 
     
 
@@ -22,6 +22,8 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 import numpy as np
 import time
 import datetime
+import queue
+import os
 
 from core.module import Connector
 from logic.generic_logic import GenericLogic
@@ -30,7 +32,93 @@ from core.util.mutex import Mutex
 from gui.guiutils import timestamp
 from threading import Thread
 from collections import deque, OrderedDict
-from itertools import islice
+
+def format_times(times):
+    """
+    Formats unix times as local "%d/%m/%y %H:%M:%S" strings, in one pass
+    over the whole array instead of one datetime per sample.
+
+    @param list times: unix times in seconds
+
+    @return numpy.ndarray: the formatted strings
+    """
+    times = np.asarray(times, dtype=np.int64)
+    if times.size == 0:
+        return np.array([], dtype="U17")
+
+    # local offset from UTC of each hour in the data, if it changes within
+    # one of these hours (daylight saving), format each sample separately
+    hours, inverse = np.unique(times // 3600, return_inverse=True)
+    starts = [time.localtime(int(h)*3600).tm_gmtoff for h in hours]
+    ends = [time.localtime(int(h)*3600 + 3599).tm_gmtoff for h in hours]
+    if starts != ends:
+        # the times are in whole seconds, reuse the string of the same second
+        strings = []
+        last_sec, last_string = None, ""
+        for sec in times.tolist():
+            if sec != last_sec:
+                last_sec = sec
+                last_string = datetime.datetime.fromtimestamp(sec).strftime("%d/%m/%y %H:%M:%S")
+            strings.append(last_string)
+        return np.array(strings)
+    local = times + np.array(starts, dtype=np.int64)[inverse]
+
+    # rearrange "YYYY-MM-DDTHH:MM:SS" into "DD/MM/YY HH:MM:SS"
+    iso = np.datetime_as_string(local.astype("datetime64[s]")).astype("U19")
+    chars = iso.view("U1").reshape(-1, 19)
+    chars = chars[:, [8, 9, 7, 5, 6, 7, 2, 3, 10, 11, 12, 13, 14, 15, 16, 17, 18]]
+    chars[:, [2, 5]] = "/"
+    chars[:, 8] = " "
+    return np.ascontiguousarray(chars).view("U17").ravel()
+
+
+class RingBuffer:
+    """
+    Fixed capacity buffer of rows of floats, the oldest rows are dropped when
+    it is full. The rows are written one after the other in an array of three
+    times the capacity, and the last ones are moved back to the front when
+    the end is reached. The content is thus always contiguous, and a view
+    returned by data() is not modified by the next capacity appends.
+
+    The values are stored column by column, so that each column of the
+    content is a contiguous array.
+
+    It is meant for one writer thread and reader threads: the bounds of the
+    content are published as a single tuple once the row is written, so
+    that a reader never sees a row which is not fully written yet.
+    """
+
+    def __init__(self, capacity, columns=1):
+        self._capacity = capacity
+        self._buffer = np.empty((columns, 3*capacity))
+        self._bounds = (0, 0)
+
+    def __len__(self):
+        start, end = self._bounds
+        return end - start
+
+    def __getitem__(self, index):
+        return self.data()[index]
+
+    def append(self, *values):
+        """ Add a row, dropping the oldest one if the buffer is full. """
+        start, end = self._bounds
+        if end == self._buffer.shape[1]:
+            self._buffer[:, :self._capacity] = self._buffer[:, end - self._capacity:]
+            start, end = 0, self._capacity
+        self._buffer[:, end] = values
+        end += 1
+        self._bounds = (max(start, end - self._capacity), end)
+
+    def data(self):
+        """
+        Return the rows from the oldest to the newest, as a view.
+
+        @return numpy.ndarray: array of shape (columns, rows)
+        """
+        start, end = self._bounds
+        return self._buffer[:, start:end]
+
 
 class CryoMonitoringLogic(GenericLogic):
     """ 
@@ -51,6 +139,13 @@ class CryoMonitoringLogic(GenericLogic):
     sigNewlHeValue = QtCore.Signal(int, float)
     sigNewTempValue = QtCore.Signal(int, float, float)
 
+    # levelmeter mode commands, any other mode switches it off
+    _LHE_MODE_MAP = {"Continuous": "C", "Sample/Hold": "S"}
+
+    # internal signals to restart the measurement timers in the logic thread
+    _sigRestartlHeTimer = QtCore.Signal()
+    _sigRestartTempTimer = QtCore.Signal()
+
     def __init__(self, config, **kwargs):
         super().__init__(config=config, **kwargs)
 
@@ -67,6 +162,28 @@ class CryoMonitoringLogic(GenericLogic):
         self._lHe_meter = self.levelmeter()
         self._thermometer = self.tempcontroller()
         self._save_logic = self.savelogic()
+
+        # measurement timers, single shot and restarted after each
+        # measurement so that a new interval applies from the next one
+        self._lHe_timer = QtCore.QTimer()
+        self._lHe_timer.setSingleShot(True)
+        self._lHe_timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self._lHe_timer.timeout.connect(self.measure_lHe)
+        self._temp_timer = QtCore.QTimer()
+        self._temp_timer.setSingleShot(True)
+        self._temp_timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self._temp_timer.timeout.connect(self.measure_temp)
+        self._sigRestartlHeTimer.connect(self._restart_lHe_timer, QtCore.Qt.QueuedConnection)
+        self._sigRestartTempTimer.connect(self._restart_temp_timer, QtCore.Qt.QueuedConnection)
+
+        # the new samples only mark the plots as changed, the update signals
+        # are sent at most every 33 ms
+        self._plot_dirty_lHe = False
+        self._plot_dirty_temp = False
+        self._refresh_timer = QtCore.QTimer()
+        self._refresh_timer.setSingleShot(True)
+        self._refresh_timer.setInterval(33)
+        self._refresh_timer.timeout.connect(self._emit_pending)
         
         # parameters
         self.saving = False
@@ -81,39 +198,63 @@ class CryoMonitoringLogic(GenericLogic):
         self.temp_channel = "A"
         self.user_comment = ""
         self.recording = False
-        self.temp_ref_time = timestamp()
-        self.lHe_ref_time = timestamp()
+        self.save_flush_interval = 60 # max time between two writes of a recording, in s
         
         # initialize data arrays
-        # arrays to store the data, arrays corresponding to the plot window
-        # and arrays for saving
-        # time is stored as an int for plots and as a string for saving
-        self.lHe_time = deque(maxlen=self.max_memory)
-        self.lHe_level = deque(maxlen=self.max_memory)
-        self.lHe_time_for_plot = deque()
-        self.lHe_level_for_plot = deque()
+        # arrays to store the data, which are also plotted, and arrays for saving
+        # time is stored as an int, it is formatted as a string when saving
+        # rows of (time, level)
+        self.lHe_data = RingBuffer(self.max_memory, 2)
         self.lHe_time_to_save = deque()
         self.lHe_level_to_save = deque()
 
-        self.temp_time = deque(maxlen=self.max_memory)
-        self.temp_valuesA = deque(maxlen=self.max_memory)
-        self.temp_valuesB = deque(maxlen=self.max_memory)
-        self.temp_time_for_plot = deque()
-        self.temp_valuesA_for_plot = deque()
-        self.temp_valuesB_for_plot = deque()
+        # rows of (time, temp A, temp B)
+        self.temp_data = RingBuffer(self.max_memory, 3)
         self.temp_time_to_save = deque()
         self.temp_valuesA_to_save = deque()
         self.temp_valuesB_to_save = deque()
+        # empty arrays swapped with the _to_save ones when saving
+        self._standby_to_save = (deque(), deque(), deque(), deque(), deque())
+
+        # the samples to save are handed to a worker thread, so that writing
+        # the files does not hold up the measurement loops
+        self._save_queue = queue.Queue()
+        # files of the current recording, opened at the first save
+        self._save_files = None
+        self._save_thread = Thread(target=self._save_worker, daemon=True)
+        self._save_thread.start()
 
         # connect internal signals
         self.sigNewlHeValue.connect(self.fill_lHe_data_arrays)
         self.sigNewTempValue.connect(self.fill_temp_data_arrays)
         
+    @property
+    def lHe_meas_interval(self):
+        """ Time between two lHe measurements, in s. """
+        return self._lHe_meas_interval
+
+    @lHe_meas_interval.setter
+    def lHe_meas_interval(self, value):
+        self._lHe_meas_interval = value
+        self._sigRestartlHeTimer.emit()
+
+    @property
+    def temp_meas_interval(self):
+        """ Time between two temperature measurements, in s. """
+        return self._temp_meas_interval
+
+    @temp_meas_interval.setter
+    def temp_meas_interval(self, value):
+        self._temp_meas_interval = value
+        self._sigRestartTempTimer.emit()
+
     def on_deactivate(self):
         """
         Stops the module.
         """
         self.stop_monitoring()
+        self._save_queue.put(None)
+        self._save_thread.join()
         return
 
 
@@ -121,13 +262,7 @@ class CryoMonitoringLogic(GenericLogic):
         """
         Tells the levelmeter to change the mode.
         """
-        if self.levelmeter_mode == "Continuous":
-            msg = "C"
-        elif self.levelmeter_mode == "Sample/Hold":
-            msg = "S"
-        else:
-            msg = "0"
-        self._lHe_meter.setMeasurementMode(msg)
+        self._lHe_meter.setMeasurementMode(self._LHE_MODE_MAP.get(self.levelmeter_mode, "0"))
         return
     
     def start_monitoring(self):
@@ -137,9 +272,7 @@ class CryoMonitoringLogic(GenericLogic):
         self.monitoring =  True
         if self.meas_lHe:
             self.launch_lHe_thread()
-        self.temp_ref_time = timestamp()
-        t = Thread(target=self.temp_meas_loop)
-        t.start()
+        self._restart_temp_timer()
         self.log.info("Started temp measuring loop.")
         return
 
@@ -149,9 +282,7 @@ class CryoMonitoringLogic(GenericLogic):
         If we were not measuring lHe but already monitoring the temp.
         """
         if self.monitoring and self.meas_lHe:
-            self.lHe_ref_time = timestamp()
-            l = Thread(target=self.lHe_meas_loop)
-            l.start()
+            self._restart_lHe_timer()
             self.log.info("Started lHe measuring loop.")
         return
 
@@ -161,6 +292,45 @@ class CryoMonitoringLogic(GenericLogic):
         Stops the monitoring process.
         """
         self.monitoring = False
+        self._lHe_timer.stop()
+        self._temp_timer.stop()
+        return
+
+
+    def _restart_lHe_timer(self, deadline=None):
+        """
+        Schedules the next lHe measurement, or stops the timer if the lHe is
+        not measured.
+
+        @param float deadline: time.monotonic() value of the next measurement,
+                               one interval from now by default
+        """
+        if self.monitoring and self.meas_lHe and np.isfinite(self.lHe_meas_interval):
+            now = time.monotonic()
+            if deadline is None:
+                deadline = now + self.lHe_meas_interval
+            self._lHe_deadline = max(deadline, now)
+            self._lHe_timer.start(int((self._lHe_deadline - now)*1000))
+        else:
+            self._lHe_timer.stop()
+        return
+
+
+    def _restart_temp_timer(self, deadline=None):
+        """
+        Schedules the next temperature measurement.
+
+        @param float deadline: time.monotonic() value of the next measurement,
+                               one interval from now by default
+        """
+        if self.monitoring:
+            now = time.monotonic()
+            if deadline is None:
+                deadline = now + self.temp_meas_interval
+            self._temp_deadline = max(deadline, now)
+            self._temp_timer.start(int((self._temp_deadline - now)*1000))
+        else:
+            self._temp_timer.stop()
         return
     
     
@@ -168,29 +338,48 @@ class CryoMonitoringLogic(GenericLogic):
         """
         Updates the plotted time window.
         """
-        # lHe 
         if self.meas_lHe:
-            try:
-                lindex = int(np.argmin(np.abs(np.array(self.lHe_time)-self.max_time_window)))
-                self.lHe_time_for_plot = deque(islice(self.lHe_time, lindex, None))
-                self.lHe_level_for_plot = deque(islice(self.lHe_level, lindex, None))
-                self.sigUpdatelHePlot.emit()
-            except Exception as e:
-                print(e)
-                self.log.warning("Could not change plotted time window for lHe")
-                
-        # temp
-        try:
-            tindex = int(np.argmin(np.abs(np.array(self.temp_time)-self.max_time_window)))
-            self.temp_time_for_plot = deque(islice(self.temp_time, tindex, None))
-            self.temp_valuesA_for_plot = deque(islice(self.temp_valuesA, tindex, None))
-            self.temp_valuesB_for_plot = deque(islice(self.temp_valuesB, tindex, None))
-            self.sigUpdateTempPlot.emit()
-        except  Exception as e:
-            print(e)
-            self.log.warning("Could not change plotted time window for temp")
-
+            self.sigUpdatelHePlot.emit()
+        self.sigUpdateTempPlot.emit()
         return
+
+
+    def _window_start(self, times):
+        """
+        Index of the first time in the plotted window.
+
+        @param numpy.ndarray times: increasing measurement times
+
+        @return int: the index
+        """
+        if len(times) == 0:
+            return 0
+        return np.searchsorted(times, times[-1] - self.max_time_window)
+
+
+    def get_lHe_plot_data(self):
+        """
+        Returns the lHe data in the plotted time window, as views of the
+        stored arrays.
+
+        @return tuple(numpy.ndarray, numpy.ndarray): times and levels
+        """
+        times, levels = self.lHe_data.data()
+        start = self._window_start(times)
+        return times[start:], levels[start:]
+
+
+    def get_temp_plot_data(self):
+        """
+        Returns the temperatures in the plotted time window, as views of the
+        stored arrays.
+
+        @return tuple(numpy.ndarray, numpy.ndarray, numpy.ndarray): times and
+                                                                    temperatures A and B
+        """
+        times, valuesA, valuesB = self.temp_data.data()
+        start = self._window_start(times)
+        return times[start:], valuesA[start:], valuesB[start:]
     
 
     def fill_lHe_data_arrays(self, meastime, lHe):
@@ -198,23 +387,13 @@ class CryoMonitoringLogic(GenericLogic):
         Puts the data from the measurement threads in the corresponding arrays.
         """
         
-        self.lHe_time.append(meastime)
-        self.lHe_level.append(lHe)
-
-        if len(self.lHe_time_for_plot)>0:
-            if self.max_time_window < meastime - self.lHe_time_for_plot[0]:
-                self.lHe_time_for_plot.popleft()
-                self.lHe_level_for_plot.popleft()
-        self.lHe_time_for_plot.append(meastime)
-        self.lHe_level_for_plot.append(lHe)
-        self.sigUpdatelHePlot.emit()
+        self.lHe_data.append(meastime, lHe)
+        self._plot_dirty_lHe = True
+        if not self._refresh_timer.isActive():
+            self._refresh_timer.start()
 
         if self.recording:
-            stringmeastime = datetime.datetime.fromtimestamp(meastime).strftime("%d/%m/%y %H:%M:%S")
-            self.lHe_time_to_save.append(stringmeastime)
-            self.lHe_level_to_save.append(lHe)
-            if len(self.lHe_time_to_save) > 5000:
-                self.save_routine()
+            self._save_queue.put(("lHe", meastime, lHe))
         
         return        
 
@@ -224,57 +403,61 @@ class CryoMonitoringLogic(GenericLogic):
         Puts the data from the measurement threads in the corresponding arrays.
         """
         
-        self.temp_time.append(meastime)
-        self.temp_valuesA.append(tempA)
-        self.temp_valuesB.append(tempB)
-
-        if len(self.temp_time_for_plot)>0:
-            if self.max_time_window < meastime - self.temp_time_for_plot[0]:
-                self.temp_time_for_plot.popleft()
-                self.temp_valuesA_for_plot.popleft()
-                self.temp_valuesB_for_plot.popleft()
-        self.temp_time_for_plot.append(meastime)
-        self.temp_valuesA_for_plot.append(tempA)
-        self.temp_valuesB_for_plot.append(tempB)
-        self.sigUpdateTempPlot.emit()
+        self.temp_data.append(meastime, tempA, tempB)
+        self._plot_dirty_temp = True
+        if not self._refresh_timer.isActive():
+            self._refresh_timer.start()
 
         if self.recording:
-            stringmeastime = datetime.datetime.fromtimestamp(meastime).strftime("%d/%m/%y %H:%M:%S")
-            self.temp_time_to_save.append(stringmeastime)
-            self.temp_valuesA_to_save.append(tempA)
-            self.temp_valuesB_to_save.append(tempB)
-            if len(self.temp_time_to_save) > 5000:
-                self.save_routine()
+            self._save_queue.put(("temp", meastime, tempA, tempB))
         return
 
     
-    def lHe_meas_loop(self):
+    def _emit_pending(self):
+        """
+        Sends one update signal for each plot which got new samples.
+        """
+        if self._plot_dirty_lHe:
+            self._plot_dirty_lHe = False
+            self.sigUpdatelHePlot.emit()
+        if self._plot_dirty_temp:
+            self._plot_dirty_temp = False
+            self.sigUpdateTempPlot.emit()
+        return
+
+    def measure_lHe(self):
         """
-        Measurement loop for lHe.
+        Measures the lHe level and schedules the next measurement.
         """
-        while self.monitoring and self.meas_lHe:
+        if not (self.monitoring and self.meas_lHe):
+            return
+        try:
             meastime = timestamp()
-            if meastime-self.lHe_ref_time > self.lHe_meas_interval:
-                val, unit = self._lHe_meter.getLevel()
-                self.fill_lHe_data_arrays(meastime, val)
-                self.lHe_ref_time = meastime
-            time.sleep(4)
+            val, unit = self._lHe_meter.getLevel()
+            self.fill_lHe_data_arrays(meastime, val)
+        except Exception:
+            self.log.exception("lHe level measurement failed.")
+        finally:
+            # counted from the previous deadline, so that the time spent
+            # measuring does not add up over the measurements
+            self._restart_lHe_timer(self._lHe_deadline + self.lHe_meas_interval)
         return
 
-    def temp_meas_loop(self):
+    def measure_temp(self):
         """
-        Measurement loop for temp.
+        Measures the temperature of both channels and schedules the next
+        measurement.
         """
-        while self.monitoring:
+        if not self.monitoring:
+            return
+        try:
             meastime = timestamp()
-            if meastime-self.temp_ref_time > self.temp_meas_interval:
-                self._thermometer.setChannel("A")
-                valA, unit = self._thermometer.getTemp()
-                self._thermometer.setChannel("B")
-                valB, unit = self._thermometer.getTemp()
-                self.fill_temp_data_arrays(meastime, valA, valB)
-                self.temp_ref_time = meastime
-            time.sleep(1)
+            valA, valB, unit = self._thermometer.getTempAll()
+            self.fill_temp_data_arrays(meastime, valA, valB)
+        except Exception:
+            self.log.exception("Temperature measurement failed.")
+        finally:
+            self._restart_temp_timer(self._temp_deadline + self.temp_meas_interval)
         return
 
     def start_recording(self):
@@ -292,47 +475,128 @@ class CryoMonitoringLogic(GenericLogic):
         """
         self.recording = False
         self.log.info("Stopped recording, saving.")
-        # call savelogic and empty the arrays
-        self.save_routine()
+        # the worker saves and empties the arrays, then closes the files
+        self._save_queue.put(("stop",))
         return
 
-    
-    def save_routine(self):
+
+    def _save_worker(self):
         """
-        Calls savelogic.
-        TODO
+        Fills the _to_save arrays with the samples from the queue and saves
+        them every 5000 points, every save_flush_interval seconds, and when
+        the recording stops. Runs in its own thread until it gets None.
+        """
+        get_item = self._save_queue.get
+        lock = self.threadlock
+        last_save = time.monotonic()
+        while True:
+            try:
+                item = get_item(timeout=max(0, last_save + self.save_flush_interval
+                                            - time.monotonic()))
+            except queue.Empty:
+                # nothing received for a while, only check the time
+                item = ("timeout",)
+            if item is None:
+                self._close_save_files()
+                return
+            kind = item[0]
+            with lock:
+                if kind == "lHe":
+                    self.lHe_time_to_save.append(item[1])
+                    self.lHe_level_to_save.append(item[2])
+                elif kind == "temp":
+                    self.temp_time_to_save.append(item[1])
+                    self.temp_valuesA_to_save.append(item[2])
+                    self.temp_valuesB_to_save.append(item[3])
+
+            flush_time = time.monotonic() - last_save >= self.save_flush_interval
+            if (kind == "stop" or len(self.lHe_time_to_save) > 5000
+                    or len(self.temp_time_to_save) > 5000 or flush_time):
+                last_save = time.monotonic()
+                if self.lHe_time_to_save or self.temp_time_to_save or kind == "stop":
+                    try:
+                        self.save_routine()
+                    except Exception as e:
+                        self.log.error("Could not save the cryo monitoring data: %s", e)
+            if kind == "stop":
+                self._close_save_files()
+
+
+    def _open_save_files(self):
+        """
+        Creates the lHe and temperature files of the recording with
+        savelogic, which writes their header, and opens them to append the
+        samples.
         """
-        # save
         filepath = self._save_logic.get_path_for_module('CryoMonitoring')
         filetimestamp = datetime.datetime.now()
         parameters = OrderedDict()
         parameters["Comment"] = self.user_comment
-        
-        lHe_save_data = OrderedDict()
-        lHe_save_data["Time"] = np.array(self.lHe_time_to_save)
-        lHe_save_data["lHe level (%)"] = np.array(self.lHe_level_to_save)
+        files = []
+        for filelabel, columns in (("lHe_level", ("Time", "lHe level (%)")),
+                                   ("temperature", ("Time", "Temp A (K)", "Temp B (K)"))):
+            # same file name as savelogic, given to it to open the file afterwards
+            if self._save_logic.active_poi_name != '':
+                filelabel = self._save_logic.active_poi_name.replace(' ', '_') + '_' + filelabel
+            filename = filetimestamp.strftime('%Y%m%d-%H%M-%S' + '_' + filelabel + '.dat')
+            # no data, only the header and the column names are written
+            empty_data = OrderedDict((column, np.zeros(0)) for column in columns)
+            self._save_logic.save_data(empty_data, filepath=filepath, parameters=parameters,
+                                       filename=filename, timestamp=filetimestamp,
+                                       delimiter="\t")
+            # large buffer, the file is written by batches of samples
+            files.append(open(os.path.join(filepath, filename), 'a', buffering=1 << 20))
+        self._save_files = tuple(files)
+        return
 
-        filelabel = "lHe_level"
-        self._save_logic.save_data(lHe_save_data, filepath=filepath, timestamp=filetimestamp,
-                                   parameters=parameters, filelabel=filelabel, fmt=["%s", "%.2f"],
-                                   delimiter="\t")
 
+    def _close_save_files(self):
+        """
+        Closes the files of the recording, if they are open.
+        """
+        if self._save_files is not None:
+            for file in self._save_files:
+                file.close()
+            self._save_files = None
+        return
 
-        temp_save_data = OrderedDict()
-        temp_save_data["Time"] = np.array(self.temp_time_to_save)
-        temp_save_data["Temp A (K)"] = np.array(self.temp_valuesA_to_save)
-        temp_save_data["Temp B (K)"] = np.array(self.temp_valuesA_to_save)
+    
+    def save_routine(self):
+        """
+        Appends the _to_save arrays to the files of the recording and empties
+        them.
+        """
+        # swap the _to_save arrays with the empty standby ones, the new
+        # samples go to those while this batch is written
+        with self.threadlock:
+            batch = (self.lHe_time_to_save, self.lHe_level_to_save, self.temp_time_to_save,
+                     self.temp_valuesA_to_save, self.temp_valuesB_to_save)
+            (self.lHe_time_to_save, self.lHe_level_to_save, self.temp_time_to_save,
+             self.temp_valuesA_to_save, self.temp_valuesB_to_save) = self._standby_to_save
+        lHe_times, lHe_levels, temp_times, temp_valuesA, temp_valuesB = batch
 
-        filelabel = "temperature"
-        self._save_logic.save_data(temp_save_data, filepath=filepath, timestamp=filetimestamp,
-                                   parameters=parameters, filelabel=filelabel,
-                                   fmt=["%s", "%.3f", "%.3f"], delimiter="\t")
-        
-        # empty the arrays
-        self.lHe_time_to_save.clear()
-        self.lHe_level_to_save.clear()
-        self.temp_time_to_save.clear()
-        self.temp_valuesA_to_save.clear()
-        self.temp_valuesB_to_save.clear()
+        try:
+            if self._save_files is None:
+                self._open_save_files()
+            lHe_file, temp_file = self._save_files
+
+            lHe_data = np.rec.fromarrays((
+                format_times(np.fromiter(lHe_times, dtype=np.float64, count=len(lHe_times))),
+                np.fromiter(lHe_levels, dtype=np.float64, count=len(lHe_levels))))
+            np.savetxt(lHe_file, lHe_data, fmt=["%s", "%.2f"], delimiter="\t")
+            lHe_file.flush()
+
+            temp_data = np.rec.fromarrays((
+                format_times(np.fromiter(temp_times, dtype=np.float64, count=len(temp_times))),
+                np.fromiter(temp_valuesA, dtype=np.float64, count=len(temp_valuesA)),
+                np.fromiter(temp_valuesB, dtype=np.float64, count=len(temp_valuesB))))
+            np.savetxt(temp_file, temp_data, fmt=["%s", "%.3f", "%.3f"], delimiter="\t")
+            temp_file.flush()
+        finally:
+            # empty the arrays, they are the standby ones for the next save
+            for values in batch:
+                values.clear()
+            with self.threadlock:
+                self._standby_to_save = batch
         return
     
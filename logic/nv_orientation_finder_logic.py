@@ -24,9 +24,11 @@ from collections import OrderedDict
 from interface.microwave_interface import MicrowaveMode
 import time
 import datetime
+import math
+from functools import partial
 import numpy as np
 import matplotlib.pyplot as plt
-from scipy.optimize import curve_fit
+from scipy.optimize import least_squares
 
 from logic.generic_logic import GenericLogic
 from core.util.mutex import Mutex
@@ -34,8 +36,127 @@ from core.module import Connector, ConfigOption, StatusVar
 from interface.microwave_interface import MicrowaveMode
 from interface.microwave_interface import TriggerEdge
 
-def B_NV(B, theta, phi, theta_tip, phi_tip):
-    return B*np.abs((np.cos(theta)*np.cos(theta_tip) + np.sin(theta)*np.sin(theta_tip)*np.cos(phi-phi_tip)))
+def _phi_sweep_model(phi, B, theta_tip, phi_tip, cos_theta, sin_theta, with_jac=False):
+    """ ESR frequency of a phi sweep at fixed theta, given by its cos and sin.
+    @param bool with_jac: also return the partial derivatives with respect to
+                          B, theta_tip and phi_tip, as the columns of a (N, 3)
+                          array, computed from the same trigonometric terms
+    """
+    cos_dphi = np.cos(phi-phi_tip)
+    proj = cos_dphi*(sin_theta*np.sin(theta_tip))
+    proj += cos_theta*np.cos(theta_tip)
+    abs_proj = np.abs(proj)
+    freq = B*abs_proj
+    freq += 2.87e9
+    if not with_jac:
+        return freq
+    sign_B = B*np.sign(proj)
+    d_theta_tip = cos_dphi*(sin_theta*np.cos(theta_tip))
+    d_theta_tip -= cos_theta*np.sin(theta_tip)
+    d_theta_tip *= sign_B
+    d_phi_tip = np.sin(phi-phi_tip)
+    d_phi_tip *= sign_B*sin_theta*np.sin(theta_tip)
+    return freq, np.column_stack((abs_proj, d_theta_tip, d_phi_tip))
+
+def _theta_sweep_model(theta, B, theta_tip, phi_tip, phi, with_jac=False):
+    """ ESR frequency of a theta sweep at fixed phi.
+    @param bool with_jac: also return the partial derivatives with respect to
+                          B, theta_tip and phi_tip, as the columns of a (N, 3)
+                          array, computed from the same trigonometric terms
+    """
+    cos_theta = np.cos(theta)
+    sin_theta = np.sin(theta)
+    cos_dphi = np.cos(phi-phi_tip)
+    proj = sin_theta*(np.sin(theta_tip)*cos_dphi)
+    proj += cos_theta*np.cos(theta_tip)
+    abs_proj = np.abs(proj)
+    freq = B*abs_proj
+    freq += 2.87e9
+    if not with_jac:
+        return freq
+    sign_B = B*np.sign(proj)
+    d_theta_tip = sin_theta*(np.cos(theta_tip)*cos_dphi)
+    d_theta_tip -= cos_theta*np.sin(theta_tip)
+    d_theta_tip *= sign_B
+    d_phi_tip = sin_theta*(np.sin(theta_tip)*np.sin(phi-phi_tip))
+    d_phi_tip *= sign_B
+    return freq, np.column_stack((abs_proj, d_theta_tip, d_phi_tip))
+
+def _theta_sweep_model_aligned(theta, B, theta_tip, with_jac=False):
+    """ ESR frequency of a theta sweep in the plane of the tip (phi = phi_tip),
+    where the projection reduces to cos(theta-theta_tip).
+    @param bool with_jac: also return the partial derivatives with respect to
+                          B and theta_tip, as the columns of a (N, 2) array
+    """
+    proj = np.cos(theta-theta_tip)
+    abs_proj = np.abs(proj)
+    freq = B*abs_proj
+    freq += 2.87e9
+    if not with_jac:
+        return freq
+    d_theta_tip = np.sin(theta-theta_tip)
+    d_theta_tip *= B*np.sign(proj)
+    return freq, np.column_stack((abs_proj, d_theta_tip))
+
+def _fit_sweep(model, x, y, sigma, p0, tol):
+    """ Weighted least squares fit of model(x, *p) to y with Levenberg-Marquardt.
+    Same result as curve_fit with absolute_sigma=False, without its input
+    checks and packing, the sweeps have only a few points.
+    The model is evaluated with its jacobian in one call, least_squares asks
+    for the jacobian at the last evaluated parameters, which are cached.
+    Points without a valid error (failed ESR fit) are left out.
+    @param float tol: ftol, xtol and gtol of the fit
+    @return tuple: optimal parameters, covariance matrix
+    """
+    valid = (sigma > 0) & np.isfinite(y)
+    if not valid.all():
+        x, y, sigma = x[valid], y[valid], sigma[valid]
+    weight = 1/sigma
+    cache = {}
+
+    def evaluate(p):
+        if "p" not in cache or not np.array_equal(p, cache["p"]):
+            freq, jac = model(x, *p, with_jac=True)
+            freq -= y
+            freq *= weight
+            jac *= weight[:, np.newaxis]
+            cache.update(p=np.copy(p), res=freq, jac=jac)
+        return cache
+
+    res = least_squares(lambda p: evaluate(p)["res"], p0, jac=lambda p: evaluate(p)["jac"],
+                        method='lm', x_scale='jac', ftol=tol, xtol=tol, gtol=tol)
+    if not res.success:
+        raise RuntimeError("Optimal parameters not found: " + res.message)
+
+    # pseudo-inverse of J^T J, scaled by the variance of the residuals
+    _, s, VT = np.linalg.svd(res.jac, full_matrices=False)
+    threshold = np.finfo(float).eps*max(res.jac.shape)*s[0]
+    s = s[s > threshold]
+    VT = VT[:s.size]
+    pcov = np.dot(VT.T/s**2, VT)
+    dof = y.size - res.x.size
+    if dof > 0:
+        pcov *= 2*res.cost/dof
+    else:
+        pcov.fill(np.inf)
+    return res.x, pcov
+
+def canonical_tip_angles(theta_tip, phi_tip):
+    """ Equivalent tip angles of the sweep models with theta_tip in [0, pi/2]
+    and phi_tip in [-pi, pi), in rad. The fits may converge to any of the
+    equivalent solutions, this keeps the start of the next fit in one place.
+    """
+    theta_tip = theta_tip % (2*np.pi)
+    if theta_tip > np.pi:
+        # same axis as (-theta_tip, phi_tip + pi)
+        theta_tip = 2*np.pi - theta_tip
+        phi_tip = phi_tip + np.pi
+    if theta_tip > np.pi/2:
+        # opposite direction, same projection in absolute value
+        theta_tip = np.pi - theta_tip
+        phi_tip = phi_tip + np.pi
+    phi_tip = (phi_tip + np.pi) % (2*np.pi) - np.pi
+    return theta_tip, phi_tip
 
 class NVOrientationFinderLogic(GenericLogic):
     """ This is the logic class to find the NV orientation using a 3D magnet.
@@ -45,6 +166,12 @@ class NVOrientationFinderLogic(GenericLogic):
     _modtype = 'logic'
 
     _magnet_type = ConfigOption("magnet_type", "coil") # otherwise "supra"
+    # relative tolerance (ftol, xtol and gtol) of the sweep fits
+    _fit_tol = ConfigOption("fit_tolerance", 1e-5)
+    # deprecated name of fit_tolerance, used if set
+    _curve_fit_tol = ConfigOption("curve_fit_tolerance", None)
+    # the sweeps are fitted every refit_every points, and on the last point
+    _refit_every = ConfigOption("refit_every", 1)
     
     # declare connectors
     microwave1 = Connector(interface='mwsourceinterface')
@@ -86,6 +213,15 @@ class NVOrientationFinderLogic(GenericLogic):
             self._magnet_logic = self.scmagnetlogic()
         else:
             self._magnet_logic = self.coilmagnetlogic()
+
+        if self._curve_fit_tol is not None:
+            self.log.warning("curve_fit_tolerance is deprecated, use fit_tolerance instead.")
+            self._fit_tol = self._curve_fit_tol
+
+        if int(self._refit_every) < 1:
+            self.log.warning("refit_every must be at least 1, got {}, using 1."
+                             "".format(self._refit_every))
+        self._refit_every = max(1, int(self._refit_every))
         
         self.user_save_path = self._save_logic.get_path_for_module('NVorientation')
 
@@ -110,9 +246,10 @@ class NVOrientationFinderLogic(GenericLogic):
         self.nb_pts = 20
         self.field_list = np.arange(self.nb_pts)
         self.sweep_counter = -1
+        self._n_valid_pts = 0
 
          # Data arrays for the ESR line
-        self.freq_esr_range = np.arange(self.start_freq, self.stop_freq + self.freq_step, self.freq_step)
+        self._update_freq_range()
         self.pl_esr = np.zeros(len(self.freq_esr_range))
         self.freq_esr_range_fit = np.zeros(len(self.freq_esr_range))
         self.pl_esr_fit = np.zeros(len(self.freq_esr_range_fit))
@@ -143,6 +280,9 @@ class NVOrientationFinderLogic(GenericLogic):
         self.theta0_theta_sweep = np.pi/3
         self.use_guess_phi = False
         self.use_guess_theta = False
+        # result of the previous fit of the current sweep, start of the next one
+        self._last_popt_phi = None
+        self._last_popt_theta = None
 
         
         self.sweep_angle = "theta" # or "phi"
@@ -198,32 +338,48 @@ class NVOrientationFinderLogic(GenericLogic):
             self.fit_theta = None
         return
 
+    def _update_freq_range(self):
+        """ Computes the ESR frequency range at the start of a sweep, and keeps
+        its number of points for the whole sweep, as freq_esr_range is then
+        replaced by the frequencies of each ODMR spectrum.
+        """
+        self.freq_esr_range = np.arange(self.start_freq, self.stop_freq + self.freq_step,
+                                        self.freq_step)
+        self._freq_n_pts = len(self.freq_esr_range)
+        return
+
     def B_from_theta_phi(self, theta, phi, ampl):
         """ From spherical to cartesian coords, ampl in G, theta, phi in deg. 
         """
-        Bx = ampl*np.sin(theta*np.pi/180)*np.cos(phi*np.pi/180)
-        By = ampl*np.sin(theta*np.pi/180)*np.sin(phi*np.pi/180)
-        Bz = ampl*np.cos(theta*np.pi/180)
+        if np.isscalar(theta) and np.isscalar(phi):
+            # single field, math is much faster than numpy on floats
+            theta = math.radians(theta)
+            phi = math.radians(phi)
+            B_perp = ampl*math.sin(theta)
+            return B_perp*math.cos(phi), B_perp*math.sin(phi), ampl*math.cos(theta)
+        theta = np.deg2rad(theta)
+        phi = np.deg2rad(phi)
+        B_perp = ampl*np.sin(theta)
+        Bx = B_perp*np.cos(phi)
+        By = B_perp*np.sin(phi)
+        Bz = ampl*np.cos(theta)
         return Bx, By, Bz
 
     def compute_field_list_phi_sweep(self):
         """ Computes the values of Bx, By, Bz to use during a phi sweep.
         """
-        Bx, By, Bz = self.B_from_theta_phi(self.theta_for_phi*np.ones(self.nb_pts),
-                                           self.phi_sweep_index, self.field_ampl)
-        self.field_list_Bx = Bx
-        self.field_list_By = By
-        self.field_list_Bz = Bz
+        Bx, By, Bz = self.B_from_theta_phi(self.theta_for_phi, self.phi_sweep_index,
+                                           self.field_ampl)
+        # one column (Bx, By, Bz) per point of the sweep, Bz is constant
+        self._field_list = np.stack(np.broadcast_arrays(Bx, By, Bz))
         return
 
     def compute_field_list_theta_sweep(self):
         """ Computes the values of Bx, By, Bz to use during a phi sweep.
         """
-        Bx, By, Bz = self.B_from_theta_phi(self.theta_sweep_index, self.phi_for_theta*np.ones(self.nb_pts),
+        Bx, By, Bz = self.B_from_theta_phi(self.theta_sweep_index, self.phi_for_theta,
                                            self.field_ampl)
-        self.field_list_Bx = Bx
-        self.field_list_By = By
-        self.field_list_Bz = Bz
+        self._field_list = np.stack((Bx, By, Bz))
         return
 
     def start_phi_sweep(self):
@@ -236,8 +392,9 @@ class NVOrientationFinderLogic(GenericLogic):
         self.log.info("Start a phi sweep")
         self.sweep_angle = "phi"
         self.sweep_counter = -1
-        self.freq_esr_range = np.arange(self.start_freq, self.stop_freq + self.freq_step, self.freq_step)
-        self.phi_sweep_full_data = np.zeros((self.nb_pts, 2*len(self.freq_esr_range)+1))
+        self._last_popt_phi = None
+        self._update_freq_range()
+        self.phi_sweep_full_data = np.zeros((self.nb_pts, 2*self._freq_n_pts+1))
         #print("start phi sweep", np.shape(self.freq_esr_range), np.shape(self.phi_sweep_full_data))
         self.phi_sweep_index = np.linspace(0, 90, self.nb_pts)
         self.compute_field_list_phi_sweep()
@@ -254,10 +411,11 @@ class NVOrientationFinderLogic(GenericLogic):
         self.log.info("Start a theta sweep")
         self.sweep_angle = "theta"
         self.sweep_counter = -1
+        self._last_popt_theta = None
         self.start_freq = self.init_start_freq
         self.stop_freq = self.init_stop_freq
-        self.freq_esr_range = np.arange(self.start_freq, self.stop_freq + self.freq_step, self.freq_step)
-        self.theta_sweep_full_data = np.zeros((self.nb_pts, 2*len(self.freq_esr_range)+1))
+        self._update_freq_range()
+        self.theta_sweep_full_data = np.zeros((self.nb_pts, 2*self._freq_n_pts+1))
         self.theta_sweep_index = np.linspace(0, 90, self.nb_pts)
         self.compute_field_list_theta_sweep()
         self.change_field()
@@ -284,16 +442,9 @@ class NVOrientationFinderLogic(GenericLogic):
         
         self.log.info("Phi value {:.1f}°".format(self.fit_phi["phi_tip"]))
         
-        if np.abs(self.fit_phi["phi_tip"]) <= 180:
-            self.phi_for_theta = self.fit_phi["phi_tip"]
-        else:
-            div = np.floor(np.abs(self.fit_phi["phi_tip"])/360)
-            self.phi_for_theta = self.fit_phi["phi_tip"] - np.sign(self.fit_phi["phi_tip"])*div*360
-#            if self.phi_for_theta > 90:
-#                self.phi_for_theta = self.phi_for_theta - 180
-#            elif self.phi_for_theta < 90:
-#                self.phi_for_theta = self.phi_for_theta + 180
-                
+        # same direction, in [-180, 180)
+        self.phi_for_theta = (self.fit_phi["phi_tip"] + 180) % 360 - 180
+
         self.log.info("Converted phi value {:.1f}°".format(self.phi_for_theta))
 
         self.sigUpdateSweepAngles.emit("phi")
@@ -323,7 +474,7 @@ class NVOrientationFinderLogic(GenericLogic):
         """
         # checks if we reached the end of the sweep
         end = False
-        if self.sweep_counter >= len(self.field_list_Bx)-1 or self.stop_measurement:
+        if self.sweep_counter >= self._field_list.shape[1]-1 or self.stop_measurement:
             # sweep over, go to zero field
             if not self.stop_measurement:
                 end = True
@@ -337,37 +488,28 @@ class NVOrientationFinderLogic(GenericLogic):
         else:
             # go to next field
             self.sweep_counter = self.sweep_counter + 1
-            self._magnet_logic.go_to_field(self.field_list_Bx[self.sweep_counter],
-                                           self.field_list_By[self.sweep_counter],
-                                           self.field_list_Bz[self.sweep_counter])
+            Bx, By, Bz = self._field_list[:, self.sweep_counter]
+            self._magnet_logic.go_to_field(Bx, By, Bz)
         return
 
     def start_odmr_measurement(self):
         """ Calls the odmr logic to record a spectrum.
         """
         if not self.stop_measurement:
-            self.sigUpdateCurrentField.emit(self.field_list_Bx[self.sweep_counter],
-                                            self.field_list_By[self.sweep_counter],
-                                            self.field_list_Bz[self.sweep_counter])
-            if self.sweep_counter == len(self.field_list_Bx)-1:
+            self.sigUpdateCurrentField.emit(*self._field_list[:, self.sweep_counter])
+            if self.sweep_counter == self._field_list.shape[1]-1:
                 self.sigUpdateNextField.emit(0, 0, 0)
             else:             
-                self.sigUpdateNextField.emit(self.field_list_Bx[self.sweep_counter+1],
-                                             self.field_list_By[self.sweep_counter+1],
-                                             self.field_list_Bz[self.sweep_counter+1])
+                self.sigUpdateNextField.emit(*self._field_list[:, self.sweep_counter+1])
                 
             #self.update_freq_params()
             #self.log.info("Update frequency window")
             self._odmr_logic.set_runtime(self.av_time)
-            
-            test = np.arange(self.start_freq, self.stop_freq + self.freq_step, self.freq_step)
-            if 2*len(test)+1 > np.size(self.freq_esr_range):
-                self.stop_freq = self.stop_freq-1
-            test = np.arange(self.start_freq, self.stop_freq + self.freq_step, self.freq_step)
-            if 2*len(test)+1 < np.size(self.freq_esr_range):
-                self.stop_freq = self.stop_freq+1
-                
-            self._odmr_logic.set_sweep_parameters(self.start_freq, self.stop_freq,
+
+            # stop on the last point, so that the spectrum has the number of
+            # points of the sweep data arrays
+            stop_freq = self.start_freq + (self._freq_n_pts-1)*self.freq_step
+            self._odmr_logic.set_sweep_parameters(self.start_freq, stop_freq,
                                                   self.freq_step, self.rf_power)
             
             self._odmr_logic.start_odmr_scan()
@@ -407,51 +549,67 @@ class NVOrientationFinderLogic(GenericLogic):
         # check if the ODMR measurement is over, if yes, save the data point and update the sweep plot
         if self.odmr_elapsed_time - self.av_time >= 0:
             #self.log.info("rem time {}".format(self.odmr_elapsed_time - self.av_time))
+            n = len(self.freq_esr_range)
+            # the sweep arrays are filled in order, up to the current point
+            self._n_valid_pts = self.sweep_counter + 1
             if self.sweep_angle == "phi":
                 phi = self.phi_sweep_index[self.sweep_counter]
                 #print("store data phi", np.shape(self.phi_sweep_full_data), len(self.freq_esr_range)*2+1)
-                self.phi_sweep_full_data[self.sweep_counter, :] = np.concatenate((np.array([phi]),
-                                                                                  self.freq_esr_range,
-                                                                                 self.pl_esr))
+                row = self.phi_sweep_full_data[self.sweep_counter]
+                row[0] = phi
+                row[1:1+n] = self.freq_esr_range
+                row[1+n:1+2*n] = self.pl_esr
                 self.phi_sweep_freq[self.sweep_counter] = self.fit_esr_params["Position"]['value']
                 self.phi_sweep_freq_error[self.sweep_counter] = self.fit_esr_params["FWHM"]['value']
                 
-                if self.sweep_counter>=4: # if we have several points, we can try to fit
+                if self._refit_now(): # if we have several points, we can try to fit
                     self.fit_phi_sweep()
                 self.sigUpdatePlotPhi.emit()
             else:
                 theta = self.theta_sweep_index[self.sweep_counter]
-                self.theta_sweep_full_data[self.sweep_counter, :] = np.concatenate((np.array([theta]),
-                                                                                    self.freq_esr_range,
-                                                                                    self.pl_esr))
-                #print("store data theta", np.shape(self.theta_sweep_full_data[self.sweep_counter, :]),
-                #np.shape(np.concatenate((np.array([theta]), self.freq_esr_range, self.pl_esr))))
+                row = self.theta_sweep_full_data[self.sweep_counter]
+                row[0] = theta
+                row[1:1+n] = self.freq_esr_range
+                row[1+n:1+2*n] = self.pl_esr
                 self.theta_sweep_freq[self.sweep_counter] = self.fit_esr_params["Position"]['value']
                 self.theta_sweep_freq_error[self.sweep_counter] = self.fit_esr_params["FWHM"]['value']
                 
-                if self.sweep_counter>=4: # if we have several points, we can try to fit
+                if self._refit_now(): # if we have several points, we can try to fit
                     self.fit_theta_sweep()
                 self.sigUpdatePlotTheta.emit()
             self.sigNextField.emit()
         return
 
+    def _refit_now(self):
+        """ Tells if the current sweep has to be fitted after the last point.
+        @return bool: True for every refit_every point from the 5th one, and for the last one
+        """
+        if self.sweep_counter < 4:
+            return False
+        return ((self.sweep_counter - 4) % self._refit_every == 0
+                or self.sweep_counter == self.nb_pts - 1)
+
     def fit_phi_sweep(self):
         """ Fits the current phi sweep to get the tip angles
         """
-        phi_list = self.phi_sweep_index[:self.sweep_counter]
-        freq_list = self.phi_sweep_freq[:self.sweep_counter]
-        freq_err = self.phi_sweep_freq_error[:self.sweep_counter]
-        func = lambda phi, B, theta_tip, phi_tip : B_NV(B, self.theta_for_phi*np.pi/180, phi,
-                                                                theta_tip, phi_tip)+2.87e9
+        phi_list = self.phi_sweep_index[:self._n_valid_pts]
+        freq_list = self.phi_sweep_freq[:self._n_valid_pts]
+        freq_err = self.phi_sweep_freq_error[:self._n_valid_pts]
+        # theta is fixed during the sweep, its sin and cos are computed once
+        theta = self.theta_for_phi*np.pi/180
+        func = partial(_phi_sweep_model, cos_theta=np.cos(theta), sin_theta=np.sin(theta))
         try:
             if self.use_guess_phi:
-                p0 = [np.max(freq_list)-np.min(freq_list), self.theta0_phi_sweep,
+                p0 = [np.ptp(freq_list), self.theta0_phi_sweep,
                       self.phi0_phi_sweep]
             else:
-                p0 = [np.max(freq_list)-np.min(freq_list), np.pi/3, np.pi/3]
-            popt, pcov = curve_fit(func, phi_list*np.pi/180, freq_list, p0=p0, sigma=freq_err)
+                p0 = [np.ptp(freq_list), np.pi/3, np.pi/3]
+            if self._last_popt_phi is not None:
+                p0 = self._last_popt_phi
+            popt, pcov = _fit_sweep(func, phi_list*np.pi/180, freq_list, freq_err, p0,
+                                    self._fit_tol)
             perr = np.sqrt(np.diag(pcov))
-        
+            self._last_popt_phi = [popt[0], *canonical_tip_angles(popt[1], popt[2])]
         
             self.phi_sweep_fit = func(self.phi_sweep_index*np.pi/180, *popt)
             self.fit_phi = {}
@@ -468,41 +626,47 @@ class NVOrientationFinderLogic(GenericLogic):
     def fit_theta_sweep(self):
         """ Fits the current theta sweep to get the tip angles
         """
-        theta_list = self.theta_sweep_index[:self.sweep_counter]
-        freq_list = self.theta_sweep_freq[:self.sweep_counter]
-        freq_err = self.theta_sweep_freq_error[:self.sweep_counter]
+        theta_list = self.theta_sweep_index[:self._n_valid_pts]
+        freq_list = self.theta_sweep_freq[:self._n_valid_pts]
+        freq_err = self.theta_sweep_freq_error[:self._n_valid_pts]
         self.fit_theta = {}
+        phi = self.phi_for_theta*np.pi/180
         print("theta_phi_measurement", self.theta_phi_measurement)
         if self.theta_phi_measurement:
             try:
-                func = lambda theta, B, theta_tip : B_NV(B, theta, self.phi_for_theta*np.pi/180,
-                                                             theta_tip, self.phi_for_theta*np.pi/180)+2.87e9
+                # phi_tip is fixed to phi
+                func = _theta_sweep_model_aligned
                 if self.use_guess_theta:
-                    p0 = [np.max(freq_list)-np.min(freq_list), self.theta0_theta_sweep]
+                    p0 = [np.ptp(freq_list), self.theta0_theta_sweep]
                 else:
-                    p0 = [np.max(freq_list)-np.min(freq_list), np.pi/3]
+                    p0 = [np.ptp(freq_list), np.pi/3]
+                if self._last_popt_theta is not None:
+                    p0 = self._last_popt_theta
 
-                popt, pcov = curve_fit(func, theta_list, freq_list, p0=p0, sigma=freq_err)
+                popt, pcov = _fit_sweep(func, theta_list*np.pi/180, freq_list, freq_err, p0,
+                                        self._fit_tol)
                 perr = np.sqrt(np.diag(pcov))
+                self._last_popt_theta = popt
                 self.fit_theta["phi_tip"] = self.phi_for_theta
                 self.fit_theta["phi_tip_error"] = self.fit_phi["phi_tip_error"]
             except:
                 self.log.info("Fit failed")
         else:
             try:
-                func = lambda theta, B, theta_tip, phi_tip : B_NV(B, theta,
-                                                                 self.phi_for_theta*np.pi/180,
-                                                                 theta_tip, phi_tip)+2.87e9
+                func = partial(_theta_sweep_model, phi=phi)
                 if self.use_guess_theta:
-                    p0 = [np.max(freq_list)-np.min(freq_list), self.theta0_theta_sweep,
+                    p0 = [np.ptp(freq_list), self.theta0_theta_sweep,
                           self.phi0_theta_sweep]
                 else:
-                    p0 = [np.max(freq_list)-np.min(freq_list), np.pi/3, np.pi/3]
-                popt, pcov = curve_fit(func, theta_list*np.pi/180, freq_list, p0=p0, sigma=freq_err)
+                    p0 = [np.ptp(freq_list), np.pi/3, np.pi/3]
+                if self._last_popt_theta is not None:
+                    p0 = self._last_popt_theta
+                popt, pcov = _fit_sweep(func, theta_list*np.pi/180, freq_list, freq_err, p0,
+                                        self._fit_tol)
                 perr = np.sqrt(np.diag(pcov))
+                self._last_popt_theta = [popt[0], *canonical_tip_angles(popt[1], popt[2])]
                 self.fit_theta["phi_tip"] = popt[2]*180/np.pi
                 self.fit_theta["phi_tip_error"] = perr[2]*180/np.pi
-                self.fit_theta["offset"] = popt[3]
             except:
                 self.log.info("Fit failed")
 